@@ -0,0 +1,66 @@
+"""Times ``import nuftio`` in fresh interpreters and checks that the heavy
+dependencies are not loaded until they are used.
+
+Usage::
+
+    python benchmarks/bench_import.py [--repeat 10] [--max-seconds 0.1]
+
+Exits with a non-zero status if the median import time is over
+``--max-seconds`` or if any of the heavy modules are loaded by the import.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HEAVY = ['discretize', 'pandas', 'properties', 'cPyparsing', 'pyparsing', 'pyvista']
+
+SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import {statement}
+elapsed = time.perf_counter() - start
+print(json.dumps(dict(seconds=elapsed, loaded=[m for m in {heavy!r} if m in sys.modules])))
+'''
+
+
+def time_import(statement='nuftio', repeat=10):
+    """Imports in ``repeat`` fresh interpreters and returns the sorted import
+    times and the heavy modules loaded by the import"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([root, env.get('PYTHONPATH', '')])
+    code = SCRIPT.format(statement=statement, heavy=HEAVY)
+    times, loaded = [], set()
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', code], env=env)
+        result = json.loads(out.decode().strip().splitlines()[-1])
+        times.append(result['seconds'])
+        loaded.update(result['loaded'])
+    return sorted(times), sorted(loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--max-seconds', type=float, default=0.1,
+                        help='The largest acceptable median time of ``import nuftio``')
+    args = parser.parse_args()
+    print('{:<28} {:>12} {:>12}  {}'.format('import', 'median (s)', 'max (s)', 'heavy modules loaded'))
+    failed = False
+    for statement in ['nuftio', 'nuftio.fileio', 'nuftio.results']:
+        times, loaded = time_import(statement, repeat=args.repeat)
+        median = times[len(times) // 2]
+        print('{:<28} {:>12.4f} {:>12.4f}  {}'.format(statement, median, times[-1], ', '.join(loaded) or '-'))
+        if statement == 'nuftio' and (median > args.max_seconds or loaded):
+            failed = True
+    if failed:
+        print('FAILED: ``import nuftio`` is slower than {} s or loads heavy modules'.format(args.max_seconds))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Compares the parsing engines of ``nuftio.Parser.parse_string`` on synthetic
+genmsh decks of increasing size.
+
+Usage::
+
+    python benchmarks/bench_parse_string.py [--sizes 10000 100000 1000000] [--no-pyparsing]
+
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nuftio import Parser
+
+
+def make_genmsh(n_tokens, nx=100, ny=100, nz=100):
+    """Creates the text of a genmsh deck with roughly ``n_tokens`` tokens. Each
+    ``mat`` box adds ten tokens to the deck."""
+    header = [
+        '(genmsh',
+        '  (coord rect)',
+        '  (down 0 0 1)',
+        '  (dx {}*1.0)'.format(nx),
+        '  (dy {}*1.0)'.format(ny),
+        '  (dz {}*1.0)'.format(nz),
+        '  (mat',
+    ]
+    lines = header
+    n_boxes = max(1, (n_tokens - 30) // 10)
+    for b in range(n_boxes):
+        i = b % nx + 1
+        j = (b // nx) % ny + 1
+        lines.append('    (rock mat{} {} {} {} {} 1 nz)'.format(b % 25, i, i, j, j))
+    lines.append('  )')
+    lines.append(')')
+    return '\n'.join(lines)
+
+
+def time_engine(text, engine, repeat=3):
+    """Returns the best wall time of ``repeat`` runs of the given engine"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        Parser.parse_string(text, engine=engine)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-pyparsing', action='store_true',
+                        help='Only time the built-in engine')
+    args = parser.parse_args()
+    print('{:>10} {:>12} {:>14} {:>9}'.format('tokens', 'fast (s)', 'pyparsing (s)', 'speedup'))
+    for size in args.sizes:
+        text = make_genmsh(size)
+        n_tok = len(Parser._tokenize(text))
+        fast = time_engine(text, 'fast', repeat=args.repeat)
+        if args.no_pyparsing:
+            print('{:>10} {:>12.4f} {:>14} {:>9}'.format(n_tok, fast, '-', '-'))
+            continue
+        slow = time_engine(text, 'pyparsing', repeat=1)
+        print('{:>10} {:>12.4f} {:>14.4f} {:>8.1f}x'.format(n_tok, fast, slow, slow / fast))
+
+
+if __name__ == '__main__':
+    main()
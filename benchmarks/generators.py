@@ -0,0 +1,127 @@
+"""Generators of synthetic NUFT inputs and results for the benchmarks. Every
+generator is seeded so that runs of the benchmarks can be compared.
+"""
+from __future__ import print_function
+
+import numpy as np
+
+PHASES = ['liquid', 'gas']
+
+
+def _runs(n, n_runs, rng):
+    """Gets ``n`` widths made of ``n_runs`` runs of equal values written in the
+    ``n*value`` notation"""
+    n_runs = max(1, min(n, n_runs))
+    cuts = np.sort(rng.choice(np.arange(1, n), n_runs - 1, replace=False)) if n_runs > 1 else []
+    counts = np.diff(np.r_[0, cuts, n]).astype(int)
+    values = np.round(rng.uniform(0.5, 10., n_runs), 3)
+    return ' '.join('{}*{}'.format(c, v) if c > 1 else '{}'.format(v) for c, v in zip(counts, values))
+
+
+def make_genmsh(nx=100, ny=100, nz=100, n_boxes=1000, n_materials=25, runs=10, seed=0):
+    """Creates the text of a genmsh deck.
+
+    Args:
+        nx, ny, nz (int): the number of cells on each axis
+        n_boxes (int): the number of ``mat`` boxes. The first box covers the
+            whole mesh (using the ``nx``, ``ny``, ``nz`` symbols) and the rest
+            are random boxes painted on top of it.
+        n_materials (int): the number of material types of the boxes
+        runs (int): the number of ``n*value`` runs in each width list
+        seed (int): the random seed
+
+    """
+    rng = np.random.default_rng(seed)
+    lines = [
+        '; a synthetic genmsh deck',
+        '(genmsh',
+        '  (coord rect)',
+        '  (down 0 0 1)',
+        '  (dx {})'.format(_runs(nx, runs, rng)),
+        '  (dy {})'.format(_runs(ny, runs, rng)),
+        '  (dz {})'.format(_runs(nz, runs, rng)),
+        '  (mat',
+        '    (rock mat0 1 nx 1 ny 1 nz)',
+    ]
+    n = max(n_boxes - 1, 0)
+    lo = [rng.integers(1, m + 1, n) for m in (nx, ny, nz)]
+    hi = [np.minimum(l + rng.integers(0, max(m // 10, 1), n), m) for l, m in zip(lo, (nx, ny, nz))]
+    mats = rng.integers(0, n_materials, n)
+    prefixes = np.where(rng.random(n) < 0.01, 'wb1', 'rock')
+    for b in range(n):
+        lines.append('    ({} mat{} {} {} {} {} {} {})'.format(
+            prefixes[b], mats[b], lo[0][b], hi[0][b], lo[1][b], hi[1][b], lo[2][b], hi[2][b]))
+    lines += ['  )', ')', '']
+    return '\n'.join(lines)
+
+
+def make_rocktab(n_materials=25, seed=0):
+    """Creates the text of a rocktab with every property of ``n_materials``
+    material types (``mat0``, ``mat1``, ...)."""
+    rng = np.random.default_rng(seed)
+    lines = ['; a synthetic rocktab', '(rocktab']
+    for m in range(n_materials):
+        k = 10. ** rng.uniform(-16, -11)
+        m_vg, slr, alpha = rng.uniform(0.2, 0.8), rng.uniform(0.01, 0.3), 10. ** rng.uniform(-6, -3)
+        kr = ' '.join('({} vanGenuchten (m {!r}) (Slr {!r}))'.format(p, m_vg, slr) for p in PHASES)
+        lines += [
+            '  (mat{}'.format(m),
+            '    (K0 {!r}) (K1 {!r}) (K2 {!r})'.format(k, k, k / 10.),
+            '    (porosity {!r})'.format(rng.uniform(0.05, 0.4)),
+            '    (solid-density {!r})'.format(rng.uniform(2500., 2800.)),
+            '    (Kd (tracer 0.0))',
+            '    (KdFactor (tracer 1.0))',
+            '    (tort (liquid constant (value {!r})))'.format(rng.uniform(0.1, 1.)),
+            '    (kr {})'.format(kr),
+            '    (pc (liquid vanGenuchten (m {!r}) (alpha {!r}) (Slr {!r})))'.format(m_vg, alpha, slr),
+            '  )',
+        ]
+    lines += [')', '']
+    return '\n'.join(lines)
+
+
+def make_tab(n_tables=10, n_rows=10000, n_cols=4, seed=0):
+    """Creates the text of a ``.tab`` file of ``n_tables`` tables each with a
+    header and ``n_rows`` rows of ``n_cols`` values"""
+    rng = np.random.default_rng(seed)
+    parts = ['; a synthetic table file']
+    header = ' '.join(['time'] + ['v{}'.format(c) for c in range(1, n_cols)])
+    for _ in range(n_tables):
+        values = rng.random((n_rows, n_cols))
+        values[:, 0] = np.arange(n_rows)
+        body = '\n'.join(' '.join(repr(v) for v in row) for row in values.tolist())
+        parts.append('(table {} ; header\n{}\n)'.format(header, body))
+    parts.append('')
+    return '\n'.join(parts)
+
+
+def write_results(filename, nx=100, ny=100, nz=100, variables=('Sl', 'P', 'T'), shuffle=False,
+                  seed=0, chunksize=1000000):
+    """Writes a results table in the layout read by ``NuftMesh.read_nuft``
+    with random widths and values. With ``shuffle`` the rows are written in
+    a random order. Returns the number of cells."""
+    from nuftio.results import NuftMesh
+    rng = np.random.default_rng(seed)
+    mesh = NuftMesh([rng.uniform(1., 2., n) for n in (nx, ny, nz)], x0=(10., -5., 100.))
+    models = {name: rng.random(mesh.nC) for name in variables}
+    if not shuffle:
+        mesh.write_nuft(filename, models, chunksize=chunksize)
+        return mesh.nC
+    # Write in cell order to a buffer and shuffle the rows
+    import io
+    buf = io.StringIO()
+    mesh.write_nuft(buf, models, chunksize=chunksize)
+    lines = buf.getvalue().splitlines()
+    rows = lines[1:]
+    order = rng.permutation(len(rows))
+    with open(filename, 'w') as f:
+        f.write(lines[0] + '\n')
+        f.write('\n'.join(rows[i] for i in order) + '\n')
+    return mesh.nC
+
+
+def write_text(filename, text):
+    """Writes generated text to a file"""
+    with open(filename, 'w') as f:
+        f.write(text)
+    return filename
@@ -0,0 +1,163 @@
+"""Runs the nuftio benchmark suite on synthetic inputs and reports the time
+and peak (traced) memory of every benchmark.
+
+Usage::
+
+    python benchmarks/run_benchmarks.py [--preset small|medium|large]
+        [--only read_nuft parse_string] [--repeat 3] [--output results.json]
+        [--compare previous.json]
+
+The inputs are generated once per preset in ``--workdir``. The results are
+written as JSON so that runs can be compared with ``--compare``.
+"""
+from __future__ import print_function
+
+import argparse
+import collections
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+import nuftio
+import generators
+
+PRESETS = {
+    'small': dict(mesh=(50, 50, 50), boxes=1000, materials=25, tables=(10, 10000),
+                  results=(50, 50, 40)),
+    'medium': dict(mesh=(200, 200, 100), boxes=20000, materials=100, tables=(20, 100000),
+                   results=(200, 200, 50)),
+    'large': dict(mesh=(500, 500, 200), boxes=200000, materials=250, tables=(50, 200000),
+                  results=(400, 250, 200)),
+}
+
+
+def _inputs(preset, workdir):
+    """Generates the input files of a preset (once) and returns their names"""
+    params = PRESETS[preset]
+    if not os.path.isdir(workdir):
+        os.makedirs(workdir)
+    files = dict(
+        genmsh=os.path.join(workdir, '{}_genmsh.in'.format(preset)),
+        rocktab=os.path.join(workdir, '{}_rocktab.in'.format(preset)),
+        tab=os.path.join(workdir, '{}_tables.tab'.format(preset)),
+        results=os.path.join(workdir, '{}_results.txt'.format(preset)),
+    )
+    nx, ny, nz = params['mesh']
+    if not os.path.isfile(files['genmsh']):
+        generators.write_text(files['genmsh'], generators.make_genmsh(
+            nx, ny, nz, n_boxes=params['boxes'], n_materials=params['materials']))
+    if not os.path.isfile(files['rocktab']):
+        generators.write_text(files['rocktab'], generators.make_rocktab(params['materials']))
+    if not os.path.isfile(files['tab']):
+        n_tables, n_rows = params['tables']
+        generators.write_text(files['tab'], generators.make_tab(n_tables, n_rows))
+    if not os.path.isfile(files['results']):
+        generators.write_results(files['results'], *params['results'], shuffle=True)
+    return files
+
+
+def _benchmarks(files):
+    """Gets the benchmarks as ``name: (setup, func)`` where ``func`` is given
+    the value returned by ``setup``. Only ``func`` is measured."""
+    def read_text(name):
+        # The text with the comments stripped as ``parse_file`` gives it
+        return lambda: nuftio.Parser._readFileContents(files[name])
+
+    def usnt():
+        u = nuftio.read_usnt(files['genmsh'], files['rocktab'], cache=False)
+        u.labels
+        return u
+
+    return collections.OrderedDict([
+        ('parse_string', (read_text('genmsh'), lambda text: nuftio.Parser.parse_string(text))),
+        ('read_genmsh', (None, lambda _: nuftio.read_genmsh(files['genmsh'], cache=False))),
+        ('read_rocktab', (None, lambda _: nuftio.read_rocktab(files['rocktab'], cache=False))),
+        ('all_models', (usnt, lambda u: u.all_models())),
+        ('parse_tab_file', (None, lambda _: nuftio.Parser.parse_tab_file(files['tab']))),
+        ('read_nuft', (None, lambda _: nuftio.NuftMesh.read_nuft(files['results']))),
+        ('read_nuft_threads', (None, lambda _: nuftio.NuftMesh.read_nuft(files['results'],
+                                                                         threads=os.cpu_count()))),
+        ('read_columns', (None, lambda _: nuftio.read_columns(files['results']))),
+    ])
+
+
+def measure(setup, func, repeat=3):
+    """Times ``repeat`` calls of ``func`` and traces the peak memory of one
+    more call. The memory run is separate so tracing does not skew the times."""
+    arg = setup() if setup is not None else None
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return dict(times=times, best=min(times), median=float(np.median(times)), peak_bytes=peak)
+
+
+def _meta(preset, files):
+    import pandas
+    return dict(
+        preset=preset,
+        params=PRESETS[preset],
+        input_bytes={name: os.path.getsize(f) for name, f in files.items()},
+        python=platform.python_version(),
+        platform=platform.platform(),
+        numpy=np.__version__,
+        pandas=pandas.__version__,
+        nuftio=nuftio.__version__,
+        date=datetime.datetime.now().isoformat(),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--only', nargs='+', help='Only run these benchmarks')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'nuftio-benchmarks'),
+                        help='Where the generated inputs are kept between runs')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='A JSON file of an earlier run to compare against')
+    args = parser.parse_args()
+
+    files = _inputs(args.preset, args.workdir)
+    previous = dict()
+    if args.compare:
+        with open(args.compare) as f:
+            previous = {b['name']: b for b in json.load(f)['benchmarks']}
+    results = []
+    print('{:<18} {:>12} {:>12} {:>14} {:>10}'.format('benchmark', 'best (s)', 'median (s)', 'peak (MiB)', 'vs prev'))
+    for name, (setup, func) in _benchmarks(files).items():
+        if args.only and name not in args.only:
+            continue
+        result = measure(setup, func, repeat=args.repeat)
+        result['name'] = name
+        results.append(result)
+        ratio = '-'
+        if name in previous:
+            ratio = '{:.2f}x'.format(previous[name]['best'] / result['best'])
+        print('{:<18} {:>12.4f} {:>12.4f} {:>14.1f} {:>10}'.format(
+            name, result['best'], result['median'], result['peak_bytes'] / 1024.**2, ratio))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(meta=_meta(args.preset, files), benchmarks=results), f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,80 @@
 """``nuftio``: File I/O for NUFT simulations"""
+from importlib import import_module as _import_module
+from sys import version_info as _version_info
 
-from .fileio import *
-from .spec import *
+#- The public names of every module. These are only imported when first
+#- accessed so that ``import nuftio`` does not load ``discretize``, ``pandas``
+#- or ``properties`` before they are needed.
+_MODULES = {
+    'fileio': [
+        'Parser',
+        'read_genmsh',
+        'read_rocktab',
+        'read_usnt',
+        'read_usnt_batch',
+        'read_tab',
+        'write_genmsh',
+        'write_rocktab',
+        'write_usnt',
+        'SectionIndex',
+        'ParseCache',
+    ],
+    'results': [
+        'NuftMesh',
+        'NuftLayout',
+        'read_nuft_series',
+        'reduce_nuft_series',
+        'SeriesStatistics',
+    ],
+    'spec': [
+        'BoxIndex',
+        'MaterialRegistry',
+        'MeshSpecifications',
+        'RockType',
+        'USNT',
+        'EQUATIONS',
+        'register_equation',
+    ],
+    'tables': [
+        'read_columns',
+        'iter_columns',
+    ],
+    'profiling': [
+        'PhaseRecord',
+        'Profile',
+        'add_hook',
+        'phase',
+        'profile',
+        'remove_hook',
+    ],
+}
+_LAZY = {name: module for module, names in _MODULES.items() for name in names}
+
+__all__ = [name for names in _MODULES.values() for name in names]
+
+
+def __getattr__(name):
+    """Imports the module of a public name on first access"""
+    if name in _MODULES:
+        return _import_module('.' + name, 'nuftio')
+    if name in _LAZY:
+        value = getattr(_import_module('.' + _LAZY[name], 'nuftio'), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module 'nuftio' has no attribute {!r}".format(name))
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + __all__ + list(_MODULES.keys()))
+
+
+if _version_info < (3, 7):
+    # Module level ``__getattr__`` needs Python 3.7
+    from .fileio import *
+    from .results import *
+    from .spec import *
+    from .tables import *
+    from .profiling import *
 
 
 # Package meta data
@@ -6,36 +6,60 @@ from __future__ import print_function
 __displayname__ = 'File I/O'
 
 __all__ = [
-    'NuftMesh',
     'Parser',
     'read_genmsh',
     'read_rocktab',
     'read_usnt',
+    'read_usnt_batch',
     'read_tab',
-
+    'write_genmsh',
+    'write_rocktab',
+    'write_usnt',
+    'SectionIndex',
+    'ParseCache',
 ]
 
 import properties
-import discretize
-import pandas as pd
 import numpy as np
-import cPyparsing as pyparsing
 import time
 import re
-import sys
-if sys.version_info < (3,):
-    from StringIO import StringIO
-else:
-    from io import StringIO
+import os
+import io
+import glob
+import hashlib
+import json
+import mmap
+import pickle
+import tempfile
+import warnings
+import contextlib
+import collections
+import concurrent.futures
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
 
 from .spec import MeshSpecifications, RockType, USNT
+from . import profiling
+from . import tables
+
+
+#- Quoted strings as matched by ``pyparsing.quotedString``. These are single
+#- tokens that may hold whitespace, openers and closers.
+_QUOTED = r'"(?:[^"\n\r\\]|""|\\(?:[^x]|x[0-9a-fA-F]+))*"' \
+          r"|'(?:[^'\n\r\\]|''|\\(?:[^x]|x[0-9a-fA-F]+))*'"
 
+#- The compiled token patterns of text with quoted strings per opener and closer
+_TOKEN_PATTERNS = dict()
 
 
 class Parser(properties.HasProperties):
     """Parses NUFT data files"""
     COMMENTS = ";"
+    ENGINES = ('fast', 'pyparsing')
+    CHUNKSIZE = 4 * 1024**2
 
     @staticmethod
     def _to_dict(lst, no=False):
@@ -89,165 +113,919 @@ class Parser(properties.HasProperties):
         """
         pass
 
+    @staticmethod
+    def _skip_rows(text, skiprows):
+        """Removes the first ``skiprows`` non-empty lines of a chunk of text.
+        Returns the remaining text and the number of rows still to skip."""
+        lines = text.split('\n')
+        for idx, line in enumerate(lines):
+            if skiprows < 1:
+                return '\n'.join(lines[idx::]), 0
+            if line.strip():
+                skiprows -= 1
+        return '', skiprows
+
+    @staticmethod
+    def _iter_raw_chunks(source, chunksize):
+        """Reads an open file-like object in chunks that always end on a line
+        break (except for the last chunk) so that no line is ever split."""
+        remainder = None
+        eof = False
+        while not eof:
+            data = source.read(chunksize)
+            eof = not data
+            if remainder:
+                data = remainder + data
+                remainder = None
+            if not data:
+                break
+            if not eof:
+                # Hold back the partial line at the end of this chunk
+                newline = b'\n' if isinstance(data, bytes) else '\n'
+                idx = data.rfind(newline) + 1
+                if idx < 1:
+                    remainder = data
+                    continue
+                data, remainder = data[:idx], data[idx::]
+            yield data
+
+    @staticmethod
+    def _iter_chunks(source, comments=';', skiprows=0, chunksize=None, memory_map=False):
+        """Streams the contents of a file in line aligned chunks of text with
+        all comments stripped and the first ``skiprows`` non-empty lines
+        removed. Only one chunk is held in memory at a time.
+
+        Args:
+            source (str or file-like): a file name or any object with a
+                ``read`` method (open text/binary files, ``mmap.mmap``, ...)
+            comments (str): the comment character
+            skiprows (int): the number of non-empty lines to skip
+            chunksize (int): the number of characters to read per chunk
+            memory_map (bool): memory map the file when ``source`` is a file
+                name rather than reading it with buffered IO.
+
+        """
+        if chunksize is None:
+            chunksize = Parser.CHUNKSIZE
+        if not hasattr(source, 'read'):
+            # A file name: open it and stream it
+            with open(source, 'rb') as f:
+                if memory_map and os.fstat(f.fileno()).st_size > 0:
+                    with contextlib.closing(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)) as mm:
+                        for chunk in Parser._iter_chunks(mm, comments=comments, skiprows=skiprows, chunksize=chunksize):
+                            yield chunk
+                else:
+                    for chunk in Parser._iter_chunks(f, comments=comments, skiprows=skiprows, chunksize=chunksize):
+                        yield chunk
+            return
+        strip = None
+        if comments:
+            strip = re.compile(re.escape(comments) + r'[^\n]*')
+        for data in Parser._iter_raw_chunks(source, chunksize):
+            if isinstance(data, bytes):
+                data = data.decode('utf-8', 'replace')
+            if strip is not None:
+                data = strip.sub('', data)
+            if skiprows > 0:
+                data, skiprows = Parser._skip_rows(data, skiprows)
+            if data:
+                yield data
+
     @staticmethod
     def _readFileContents(filename, comments=';', skiprows=0):
         """Reads the contents of a file to a giant text string"""
-        # Load in all the file lines
-        text = np.genfromtxt(filename,
-                            dtype=str,
-                            delimiter='\n',
-                            comments=comments)[skiprows::]
-        return '\n'.join(text)
+        return ''.join(Parser._iter_chunks(filename, comments=comments, skiprows=skiprows))
 
 
     @staticmethod
-    def parse_file(filename, comments=';', skiprows=0, opener='(', closer=')'):
-        """Parses general NUFT data file into a disctionary. If it is a table
-        then use the ``parse_tab_file`` method.
-        """
-        text = Parser._readFileContents(filename, comments=comments, skiprows=skiprows)
-        # Run the parsing and get a nest list of the results
-        return Parser.parse_string(text, opener=opener, closer=closer)
+    def _tokenize(text, opener='(', closer=')'):
+        """Splits a string of NUFT text into a flat list of tokens where the
+        opener and closer are always their own tokens. Quoted strings that
+        start a token are kept whole (with their quotes) like ``pyparsing``."""
+        if '"' in text or "'" in text:
+            return Parser._quoted_tokens(opener, closer).findall(text)
+        text = text.replace(opener, ' {} '.format(opener))
+        text = text.replace(closer, ' {} '.format(closer))
+        return text.split()
+
+    @staticmethod
+    def _quoted_tokens(opener, closer):
+        """Gets the (cached) regular expression of the tokens of text with
+        quoted strings"""
+        if (opener, closer) not in _TOKEN_PATTERNS:
+            o, c = re.escape(opener), re.escape(closer)
+            _TOKEN_PATTERNS[(opener, closer)] = re.compile(
+                r'{}|{}|{}|(?:(?!{}|{})\S)+'.format(_QUOTED, o, c, o, c))
+        return _TOKEN_PATTERNS[(opener, closer)]
+
+    @staticmethod
+    def _nest(token_lists, opener='(', closer=')'):
+        """Builds the nested lists of an iterable of token lists (e.g. one per
+        streamed chunk) in a single pass using a stack rather than a grammar.
+        The returned list holds every top-level data block."""
+        root = []
+        stack = []
+        current = root
+        for tokens in token_lists:
+            for tok in tokens:
+                if tok == opener:
+                    block = []
+                    current.append(block)
+                    stack.append(current)
+                    current = block
+                elif tok == closer:
+                    if not stack:
+                        raise RuntimeError('Unbalanced "{}" found in the input text.'.format(closer))
+                    current = stack.pop()
+                elif not stack:
+                    raise RuntimeError('Token ("{}") found outside of a data block.'.format(tok))
+                else:
+                    current.append(tok)
+        if stack:
+            raise RuntimeError('Unbalanced "{}" found in the input text.'.format(opener))
+        if len(root) < 1:
+            raise RuntimeError('No data blocks found in the input text.')
+        return root
 
     @staticmethod
-    def parse_string(text, opener='(', closer=')'):
-        """Perses a string of text in NUFT data format to nested dictionaries"""
-        # start_time = time.time()
-        # print('Parsing...', end='\r')
+    def _parse_pyparsing(text, opener='(', closer=')'):
+        """Parses text to nested lists with the (slow) ``pyparsing`` grammar"""
+        try:
+            import cPyparsing as pyparsing
+        except ImportError:
+            try:
+                import pyparsing
+            except ImportError:
+                raise RuntimeError('The "pyparsing" engine requires cPyparsing or pyparsing to be installed.')
         # Create the data block parser
         r = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ!"#$%&\'*+,-./:;<=>?@[\]^_`{|}~'
         se = pyparsing.nestedExpr(opener=opener, closer=closer, content=pyparsing.Word(r))
         # Run the parsing and get a nest list of the results
-        results = se.parse_string(text)
-        results = results.asList()
-        # print('Parsed text in {} seconds'.format(time.time() - start_time))
+        results = se.parseString(text)
+        return results.asList()
+
+    @staticmethod
+    def _scan_blocks(source, comments=';', skiprows=0, opener='(', closer=')', chunksize=None):
+        """Scans an open binary file once and returns the ``(start, end)`` byte
+        offsets of every top-level data block. Comments are blanked out in
+        place so that the offsets still match the file and the block depth is
+        tracked with vectorized cumulative sums over each chunk."""
+        if len(opener) != 1 or len(closer) != 1:
+            raise RuntimeError('Lazy indexing requires single character openers and closers.')
+        if chunksize is None:
+            chunksize = Parser.CHUNKSIZE
+        comment = comments.encode() if comments else None
+        strip = None
+        if comment:
+            strip = re.compile(re.escape(comment) + b'[^\n]*')
+        # Skip the leading rows
+        offset = 0
+        while skiprows > 0:
+            line = source.readline()
+            if not line:
+                break
+            offset += len(line)
+            if comment:
+                line = line.split(comment)[0]
+            if line.strip():
+                skiprows -= 1
+        quoted = re.compile(_QUOTED.encode())
+        op, cl = ord(opener), ord(closer)
+        blocks = []
+        depth = 0
+        start = None
+        for data in Parser._iter_raw_chunks(source, chunksize):
+            if strip is not None:
+                data = strip.sub(lambda m: b' ' * len(m.group(0)), data)
+            if b'"' in data or b"'" in data:
+                # Openers and closers in quoted strings do not nest
+                data = quoted.sub(lambda m: b'_' * len(m.group(0)), data)
+            arr = np.frombuffer(data, dtype=np.uint8)
+            idx = np.flatnonzero((arr == op) | (arr == cl))
+            if idx.size > 0:
+                is_open = arr[idx] == op
+                level = depth + np.cumsum(np.where(is_open, 1, -1))
+                if level.min() < 0:
+                    raise RuntimeError('Unbalanced "{}" found in the input text.'.format(closer))
+                edges = np.flatnonzero((is_open & (level == 1)) | (~is_open & (level == 0)))
+                for e in edges:
+                    if is_open[e]:
+                        start = offset + int(idx[e])
+                    else:
+                        blocks.append((start, offset + int(idx[e]) + 1))
+                        start = None
+                depth = int(level[-1])
+            offset += len(data)
+        if depth != 0:
+            raise RuntimeError('Unbalanced "{}" found in the input text.'.format(opener))
+        return blocks
+
+    @staticmethod
+    def index_file(filename, comments=';', skiprows=0, opener='(', closer=')', chunksize=None):
+        """Scans a NUFT data file once and returns a :class:`SectionIndex`: a
+        lazy mapping of every top-level data block that is only parsed when
+        its key is accessed.
+
+        Args:
+            filename (str or file-like): the file name or an open, seekable
+                file-like object (including ``mmap.mmap`` objects)
+
+        """
+        with profiling.phase('scan') as ph:
+            if hasattr(filename, 'read'):
+                if isinstance(filename.read(0), str):
+                    # Text streams cannot be seeked by byte offsets
+                    filename = io.BytesIO(filename.read().encode('utf-8'))
+                filename.seek(0)
+                blocks = Parser._scan_blocks(filename, comments=comments, skiprows=skiprows,
+                                             opener=opener, closer=closer, chunksize=chunksize)
+            else:
+                with open(filename, 'rb') as f:
+                    blocks = Parser._scan_blocks(f, comments=comments, skiprows=skiprows,
+                                                 opener=opener, closer=closer, chunksize=chunksize)
+            ph.count(blocks=len(blocks))
+        return SectionIndex(filename, blocks, comments=comments, opener=opener, closer=closer)
+
+    @staticmethod
+    def parse_file(filename, comments=';', skiprows=0, opener='(', closer=')',
+                   engine='fast', chunksize=None, memory_map=False, lazy=False, cache=None):
+        """Parses general NUFT data file into a disctionary. If it is a table
+        then use the ``parse_tab_file`` method.
+
+        Args:
+            filename (str or file-like): the file name or an open file-like
+                object (including ``mmap.mmap`` objects)
+            engine (str): the parsing backend (see :meth:`parse_string`). The
+                ``'fast'`` engine streams the file straight into the tokenizer
+                one chunk at a time.
+            chunksize (int): the number of characters read per chunk
+            memory_map (bool): memory map the file rather than reading it
+            lazy (bool): only index the top-level data blocks and return a
+                :class:`SectionIndex` that parses each block on access.
+            cache (bool or str): store the parsed dictionary in a
+                :class:`ParseCache` (``True`` for the default directory or the
+                path of a directory). Defaults to the ``NUFTIO_PARSE_CACHE``
+                environment variable. Only used for file names.
+
+        """
+        if lazy:
+            return Parser.index_file(filename, comments=comments, skiprows=skiprows,
+                                     opener=opener, closer=closer, chunksize=chunksize)
+        store = ParseCache.resolve(cache) if not hasattr(filename, 'read') else None
+        if store is not None:
+            key = store.key(filename, 'parse', comments=comments, skiprows=skiprows,
+                            opener=opener, closer=closer)
+            return store.fetch(key, lambda: Parser.parse_file(
+                filename, comments=comments, skiprows=skiprows, opener=opener, closer=closer,
+                engine=engine, chunksize=chunksize, memory_map=memory_map, cache=False))
+        chunks = Parser._iter_chunks(filename, comments=comments, skiprows=skiprows,
+                                     chunksize=chunksize, memory_map=memory_map)
+        if engine != 'fast':
+            return Parser.parse_string(''.join(chunks), opener=opener, closer=closer, engine=engine)
+        # Run the parsing and get a nest list of the results
+        with profiling.phase('tokenize') as ph:
+            def tokens():
+                for chunk in chunks:
+                    toks = Parser._tokenize(chunk, opener=opener, closer=closer)
+                    ph.count(bytes=len(chunk), tokens=len(toks))
+                    yield toks
+            results = Parser._nest(tokens(), opener=opener, closer=closer)
+        with profiling.phase('to_dict'):
+            return Parser._to_dict(results)
+
+    @staticmethod
+    def parse_string(text, opener='(', closer=')', engine='fast'):
+        """Perses a string of text in NUFT data format to nested dictionaries
+
+        Args:
+            text (str): the NUFT formatted text
+            opener (str): the character opening a data block
+            closer (str): the character closing a data block
+            engine (str): the parsing backend: ``'fast'`` for the built-in
+                stack based tokenizer or ``'pyparsing'`` for the original
+                (and much slower) ``nestedExpr`` grammar.
+
+        """
+        if engine not in Parser.ENGINES:
+            raise RuntimeError('Parsing engine ("{}") not valid. Use one of: {}'.format(engine, Parser.ENGINES))
+        with profiling.phase('tokenize', bytes=len(text)) as ph:
+            if engine == 'fast':
+                tokens = Parser._tokenize(text, opener=opener, closer=closer)
+                ph.count(tokens=len(tokens))
+                results = Parser._nest([tokens], opener=opener, closer=closer)
+            else:
+                results = Parser._parse_pyparsing(text, opener=opener, closer=closer)
         # Now turn that nested dictionary into data objects!
-        data = Parser._to_dict(results)
+        with profiling.phase('to_dict'):
+            data = Parser._to_dict(results)
         return data
 
     @staticmethod
-    def parse_tab_file(filename, comments=';', skiprows=0, opener='(', closer=')', names=None):
+    def _iter_tables(filename, comments=';', skiprows=0, opener='(', closer=')'):
+        """Walks a file once and yields the text inside every ``(table ...)``
+        block without ever joining the whole file into one string."""
+        marker = '{}table'.format(opener)
+        carry = ''
+        parts = None
+        for chunk in Parser._iter_chunks(filename, comments=comments, skiprows=skiprows):
+            pos = 0
+            if parts is None:
+                chunk = carry + chunk
+            while True:
+                if parts is None:
+                    start = chunk.find(marker, pos)
+                    if start < 0:
+                        carry = chunk[max(pos, len(chunk) - len(marker) + 1)::]
+                        break
+                    pos = start + len(marker)
+                    parts = []
+                end = chunk.find(closer, pos)
+                if end < 0:
+                    parts.append(chunk[pos::])
+                    carry = ''
+                    break
+                parts.append(chunk[pos:end])
+                yield ''.join(parts)
+                parts = None
+                pos = end + len(closer)
+        if parts is not None:
+            raise RuntimeError('Unbalanced "{}" found in the input text.'.format(opener))
+
+    @staticmethod
+    def _is_number(tok):
+        try:
+            float(tok)
+        except ValueError:
+            return False
+        return True
+
+    @staticmethod
+    def _table_to_array(text, names=None):
+        """Converts the text of one table to a 2D float array and its column
+        names. A first line that is not all numbers is the header and is
+        skipped. Without ``names`` the header gives the column names, or the
+        columns are numbered if there is no header."""
+        text = text.strip()
+        first, _, rest = text.partition('\n')
+        header = first.split()
+        if not all(Parser._is_number(tok) for tok in header):
+            if names is None:
+                names = header
+            text = rest
+        ncols = len(names) if names is not None else len(header)
+        arr = tables._parse_values(text, ncols, where=' in a table', lines=False)
+        if names is None:
+            names = list(range(ncols))
+        return arr, list(names)
+
+    @staticmethod
+    def iter_tab_file(filename, comments=';', skiprows=0, opener='(', closer=')', names=None, structured=False):
+        """Iterates over the tables in a NUFT table data file (``.tab`` files)
+        yielding each one as soon as it is read.
+
+        Args:
+            filename (str or file-like): the file name or an open file
+            names (list(str)): the column names of every table. If not given
+                the first line of each table is used.
+            structured (bool): yield NumPy structured arrays rather than
+                Pandas ``DataFrame`` objects.
+
+        """
+        if not structured:
+            import pandas as pd
+        for text in Parser._iter_tables(filename, comments=comments, skiprows=skiprows,
+                                        opener=opener, closer=closer):
+            arr, cols = Parser._table_to_array(text, names=names)
+            if structured:
+                yield np.rec.fromarrays(arr.T, names=[str(c) for c in cols])
+            else:
+                yield pd.DataFrame(arr, columns=cols)
+
+    @staticmethod
+    def parse_tab_file(filename, comments=';', skiprows=0, opener='(', closer=')', names=None, structured=False):
         """Reads the NUFT table data format (``.tab`` files)."""
-        # reade the file lines
-        text = Parser._readFileContents(filename, comments=comments, skiprows=skiprows)
-        # now find all tables
-        TABLE = re.compile(r'\(table(.+?)\)', re.MULTILINE|re.DOTALL)
-        tables = TABLE.findall(text)
-        if len(tables) < 1:
+        with profiling.phase('read_tab') as ph:
+            dfs = list(Parser.iter_tab_file(filename, comments=comments, skiprows=skiprows, opener=opener,
+                                            closer=closer, names=names, structured=structured))
+            ph.count(tables=len(dfs), rows=sum(len(df) for df in dfs))
+        if len(dfs) < 1:
             raise RuntimeError('No tables found in the iput file.')
-        dfs = []
-        # Now create pandas data frames of all the tables in that file
-        for tab in tables:
-            dfs.append(pd.read_table(StringIO(tables[0]), delim_whitespace=True, names=names))
         if len(dfs) == 1:
             # Id only one dataframe, return it
             return dfs[0]
         return dfs
 
 
+class ParseCache(object):
+    """An on-disk cache of parsed NUFT data (the nested dictionaries of
+    :meth:`Parser.parse_file` and the spec objects of :func:`read_genmsh` and
+    :func:`read_rocktab`) so that decks read again by other processes skip
+    tokenization entirely.
+
+    Entries are pickles keyed on a hash of the file contents and the parse
+    options, so a renamed or copied deck is still a hit and an edited deck is
+    a miss. When the entries outgrow ``max_size`` bytes the least recently
+    used are removed. Only point the cache at a trusted directory since the
+    entries are unpickled.
+
+    The cache is turned on for every read by setting the ``NUFTIO_PARSE_CACHE``
+    environment variable to ``1`` (the default directory) or to a directory
+    and its size with ``NUFTIO_PARSE_CACHE_SIZE`` (in bytes).
+
+    Args:
+        path (str): the cache directory (created if needed)
+        max_size (int): the total size of the entries in bytes
+
+    """
+
+    ENV = 'NUFTIO_PARSE_CACHE'
+    ENV_SIZE = 'NUFTIO_PARSE_CACHE_SIZE'
+    VERSION = 1
+    MAX_SIZE = 1024**3
+
+    def __init__(self, path=None, max_size=None):
+        if path is None:
+            path = os.path.join(os.path.expanduser('~'), '.cache', 'nuftio')
+        if max_size is None:
+            max_size = int(os.environ.get(ParseCache.ENV_SIZE, ParseCache.MAX_SIZE))
+        self.path = path
+        self.max_size = max_size
+
+    @staticmethod
+    def resolve(cache=None):
+        """Gets the ``ParseCache`` of a ``cache`` argument: ``None`` reads the
+        environment variable, ``True`` is the default directory, a string is a
+        directory and ``False`` turns the cache off (returns ``None``)."""
+        if isinstance(cache, ParseCache):
+            return cache
+        if cache is None:
+            cache = os.environ.get(ParseCache.ENV, '')
+            if cache.lower() in ['', '0', 'false', 'no', 'off']:
+                return None
+            if cache.lower() in ['1', 'true', 'yes', 'on']:
+                cache = True
+        if cache is False:
+            return None
+        return ParseCache(None if cache is True else cache)
+
+    def key(self, filename, kind, **options):
+        """Gets the key of a file parsed as ``kind`` with the given options"""
+        digest = hashlib.sha1()
+        digest.update(json.dumps([ParseCache.VERSION, kind, _file_hash(filename),
+                                  sorted(options.items())]).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.path, '{}.pkl'.format(key))
+
+    def get(self, key):
+        """Loads an entry (``None`` if missing or unreadable) and marks it as
+        recently used"""
+        entry = self._entry(key)
+        try:
+            with open(entry, 'rb') as f:
+                value = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        """Stores an entry and evicts the least recently used entries if the
+        cache is over its size. The entry is written to a temporary file and
+        swapped in so readers never see a partial entry."""
+        tmp = None
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            fd, tmp = tempfile.mkstemp(dir=self.path, prefix='.nuftio-')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._entry(key))
+        except (IOError, OSError, pickle.PicklingError) as e:
+            warnings.warn('Could not write the parse cache ("{}"): {}'.format(self.path, e))
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self.evict()
+
+    def fetch(self, key, func):
+        """Gets an entry or makes it with ``func`` and stores it"""
+        value = self.get(key)
+        if value is None:
+            value = func()
+            self.put(key, value)
+        return value
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in
+        ``max_size`` bytes"""
+        entries = []
+        for entry in glob.glob(os.path.join(self.path, '*.pkl')):
+            try:
+                stat = os.stat(entry)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        total = sum(e[1] for e in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(entry)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Removes every entry of the cache"""
+        for entry in glob.glob(os.path.join(self.path, '*.pkl')):
+            os.remove(entry)
+
+
+class SectionIndex(Mapping):
+    """A read-only mapping of the top-level data blocks in a NUFT data file
+    created by :meth:`Parser.index_file`. Only the byte offsets of each block
+    are held until a key is accessed: then that block alone is read, parsed
+    and cached.
+    """
+
+    def __init__(self, source, blocks, comments=';', opener='(', closer=')'):
+        self._source = source
+        self._comments = comments
+        self._opener = opener
+        self._closer = closer
+        self._cache = dict()
+        self.offsets = dict()
+        for start, end in blocks:
+            key = self._read_key(start, end)
+            if key is None:
+                # The block does not start with a name: parse it to find out
+                key, = self._parse_block(start, end).keys()
+            self.offsets[key] = (start, end)
+
+    def _read(self, start, end):
+        """Reads the raw bytes of the file between two offsets"""
+        if hasattr(self._source, 'read'):
+            self._source.seek(start)
+            return self._source.read(end - start)
+        with open(self._source, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    def _read_key(self, start, end, head=256):
+        """Reads the name of the data block at the given offsets"""
+        while True:
+            stop = min(end, start + head)
+            text = ''.join(Parser._iter_chunks(io.BytesIO(self._read(start, stop)),
+                                               comments=self._comments))
+            tokens = Parser._tokenize(text, opener=self._opener, closer=self._closer)
+            if len(tokens) > 2 or stop == end:
+                break
+            head *= 4
+        if len(tokens) < 2 or tokens[1] in (self._opener, self._closer):
+            return None
+        return tokens[1].replace('-', '_')
+
+    def _parse_block(self, start, end):
+        """Parses a single data block to a nested dictionary"""
+        return Parser.parse_file(io.BytesIO(self._read(start, end)), comments=self._comments,
+                                 opener=self._opener, closer=self._closer)
+
+    def __getitem__(self, key):
+        if key not in self._cache:
+            start, end = self.offsets[key]
+            self._cache[key] = self._parse_block(start, end)[key]
+        return self._cache[key]
+
+    def __contains__(self, key):
+        # Do not parse a block to test for its key
+        return key in self.offsets
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __repr__(self):
+        return '<{} of sections: {}>'.format(type(self).__name__, list(self.offsets.keys()))
+
+
 # Now define the functions that we want to use
 
-def read_genmsh(filename, comments=';', skiprows=0, opener='(', closer=')', usnt=False):
-    """Reads genmsh specifiation files"""
-    datadict = Parser.parse_file(filename, comments=comments, skiprows=skiprows, opener=opener, closer=closer)
-    keys = list(datadict.keys())
-    if len(keys) != 1:
-        raise RuntimeError('This file is specifies too many/few data structures: {}'.format(keys))
-    if keys[0] != 'genmsh':
-        raise RuntimeError('The data type ({}) is not (genmsh).'.format(keys[0]))
+def read_genmsh(filename, comments=';', skiprows=0, opener='(', closer=')', usnt=False, cache=None):
+    """Reads genmsh specifiation files. Only the ``genmsh`` data block is
+    parsed so this can also be given a full input deck. With a ``cache`` (see
+    :meth:`Parser.parse_file`) the created specifications of a file name are
+    stored in a :class:`ParseCache`."""
+    store = ParseCache.resolve(cache) if not hasattr(filename, 'read') else None
+    if store is not None:
+        key = store.key(filename, 'usnt' if usnt else 'genmsh', comments=comments,
+                        skiprows=skiprows, opener=opener, closer=closer)
+        return store.fetch(key, lambda: read_genmsh(filename, comments=comments, skiprows=skiprows,
+                                                    opener=opener, closer=closer, usnt=usnt, cache=False))
+    datadict = Parser.index_file(filename, comments=comments, skiprows=skiprows, opener=opener, closer=closer)
+    if 'genmsh' not in datadict:
+        raise RuntimeError('The data type(s) ({}) is not (genmsh).'.format(list(datadict.keys())))
     # Okay we got a genmsh
     if usnt:
-        return USNT._create(datadict[keys[0]])
-    return MeshSpecifications._create(datadict[keys[0]])
-
-
-def read_rocktab(filename, comments=';', skiprows=0, opener='(', closer=')'):
-    """Reads rocktab material specification files"""
-    datadict = Parser.parse_file(filename, comments=comments, skiprows=skiprows, opener=opener, closer=closer)
-    keys = list(datadict.keys())
-    if len(keys) != 1:
-        raise RuntimeError('This file is specifies too many/few data structures: {}'.format(keys))
-    if keys[0] != 'rocktab':
-        raise RuntimeError('The data type ({}) is not (rocktab).'.format(keys[0]))
+        return USNT._create(datadict['genmsh'])
+    return MeshSpecifications._create(datadict['genmsh'])
+
+
+def read_rocktab(filename, comments=';', skiprows=0, opener='(', closer=')', cache=None):
+    """Reads rocktab material specification files. Only the ``rocktab`` data
+    block is parsed so this can also be given a full input deck. With a
+    ``cache`` the created rock types are stored in a :class:`ParseCache`."""
+    store = ParseCache.resolve(cache) if not hasattr(filename, 'read') else None
+    if store is not None:
+        key = store.key(filename, 'rocktab', comments=comments, skiprows=skiprows,
+                        opener=opener, closer=closer)
+        return store.fetch(key, lambda: read_rocktab(filename, comments=comments, skiprows=skiprows,
+                                                     opener=opener, closer=closer, cache=False))
+    datadict = Parser.index_file(filename, comments=comments, skiprows=skiprows, opener=opener, closer=closer)
+    if 'rocktab' not in datadict:
+        raise RuntimeError('The data type(s) ({}) is not (rocktab).'.format(list(datadict.keys())))
     # Okay we got a rocktab
+    rocktab = datadict['rocktab']
     tabs = {}
-    for k, v in datadict[keys[0]].items():
-        tabs[k] = RockType._create(k, v)
+    with profiling.phase('create_rocktab', rock_types=len(rocktab)):
+        for k, v in rocktab.items():
+            tabs[k] = RockType._create(k, v)
     return tabs
 
 
-def read_usnt(fname_mesh, fname_rtab,  comments=';', skiprows=0, opener='(', closer=')'):
+def read_usnt(fname_mesh, fname_rtab,  comments=';', skiprows=0, opener='(', closer=')', cache=None):
     """Reads mesh specifications and rock property table into one data object"""
-    usnt = read_genmsh(fname_mesh, comments=comments, skiprows=skiprows, opener=opener, closer=closer, usnt=True)
-    rocktab = read_rocktab(fname_rtab, comments=comments, skiprows=skiprows, opener=opener, closer=closer)
+    usnt = read_genmsh(fname_mesh, comments=comments, skiprows=skiprows, opener=opener, closer=closer, usnt=True, cache=cache)
+    rocktab = read_rocktab(fname_rtab, comments=comments, skiprows=skiprows, opener=opener, closer=closer, cache=cache)
     usnt.rocktab = rocktab
     return usnt
 
-def read_tab(filename, comments=';', skiprows=0, opener='(', closer=')', names=None):
-    """Reads the NUFT table data format (``.tab`` files)."""
-    return Parser.parse_tab_file(filename, comments=comments, skiprows=skiprows, opener=opener, closer=closer, names=names)
 
+#- The rock tables of recent ``read_usnt_batch`` calls keyed by their content
+_ROCKTAB_CACHE = collections.OrderedDict()
+ROCKTAB_CACHE_SIZE = 16
 
 
-class NuftMesh(discretize.TensorMesh):
-    """This is an extension of ``discretize``s ``TensorMesh`` to provide
-    file IO for NUFT simulation results"""
+def _file_hash(filename, chunksize=4 * 1024**2):
+    """Gets the SHA-1 digest of the contents of a file"""
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for data in iter(lambda: f.read(chunksize), b''):
+            digest.update(data)
+    return digest.hexdigest()
 
 
-    @classmethod
-    def read_nuft(TensorMesh, filename, fix_indices=True):
-        """Run the Foo algorithm on an input number ``nub``.
+def _read_rocktab_cached(filename, **kwargs):
+    """Reads a rocktab through a least recently used cache keyed on the
+    content of the file so that copies of a file are only parsed once."""
+    key = (_file_hash(filename), tuple(sorted(kwargs.items())))
+    if key in _ROCKTAB_CACHE:
+        _ROCKTAB_CACHE[key] = _ROCKTAB_CACHE.pop(key)
+        return _ROCKTAB_CACHE[key]
+    rocktab = read_rocktab(filename, **kwargs)
+    _ROCKTAB_CACHE[key] = rocktab
+    while len(_ROCKTAB_CACHE) > ROCKTAB_CACHE_SIZE:
+        _ROCKTAB_CACHE.popitem(last=False)
+    return rocktab
 
-        Args:
-            filename (str): the relative or absolute file name
-            fix_indices (bool): If True, decrease the indexing arrays by one
-                because someone chose to use +1 indexing in the NUFT format.
 
-        """
-        # read the NUFT results using pandas because its a big ol table
+def _compact_specs(specs):
+    """Gets the compact array form of mesh specifications"""
+    return dict(coord=specs.coord, down=specs.down, dx=specs.dx, dy=specs.dy, dz=specs.dz,
+                components=list(specs.components), boxes=specs.boxes,
+                box_components=specs.box_components)
+
+
+def _read_genmsh_task(args):
+    """Reads one mesh of a batch in a worker process. Errors are returned
+    rather than raised so that one bad file does not stop the batch."""
+    filename, compact, kwargs = args
+    start = time.perf_counter()
+    try:
+        specs = read_genmsh(filename, usnt=True, **kwargs)
+        if compact:
+            specs = _compact_specs(specs)
+        return specs, None, time.perf_counter() - start
+    except Exception as e:
+        return None, '{}: {}'.format(type(e).__name__, e), time.perf_counter() - start
+
+
+def read_usnt_batch(mesh_files, rocktab_files, workers=None, compact=False, comments=';',
+                    skiprows=0, opener='(', closer=')'):
+    """Reads many genmsh files paired with (a few) rocktab files.
+
+    Every unique rocktab is parsed once: the rock tables are kept in a least
+    recently used cache keyed on the contents of the file (see
+    ``ROCKTAB_CACHE_SIZE``) and the ``USNT`` objects that share a rocktab
+    share its ``RockType`` objects. The meshes are parsed in a process pool.
+
+    Args:
+        mesh_files (list(str)): the genmsh files
+        rocktab_files (str or list(str)): one rocktab for every mesh or a
+            single rocktab for all of them
+        workers (int): the number of worker processes. Defaults to the number
+            of CPUs. Use ``1`` to read the meshes in this process.
+        compact (bool): If True, return a dictionary of the compact arrays of
+            each mesh (``coord``, ``down``, ``dx``, ``dy``, ``dz``,
+            ``components``, ``boxes``, ``box_components``) and its rock
+            table as ``rocktab`` rather than ``USNT`` objects
+
+    Return:
+        tuple: a list of the results in the order of ``mesh_files`` (``None``
+        for files that failed) and a list of reports with the ``mesh`` and
+        ``rocktab`` file names, the ``mesh_time`` and ``rocktab_time`` in
+        seconds and the ``error`` (``None`` on success) of every pair
+
+    """
+    mesh_files = list(mesh_files)
+    if isinstance(rocktab_files, str):
+        rocktab_files = [rocktab_files] * len(mesh_files)
+    rocktab_files = list(rocktab_files)
+    if len(rocktab_files) != len(mesh_files):
+        raise RuntimeError('The number of rocktab files ({}) does not match the number of mesh files ({}).'.format(
+            len(rocktab_files), len(mesh_files)))
+    kwargs = dict(comments=comments, skiprows=skiprows, opener=opener, closer=closer)
+    reports = [dict(mesh=m, rocktab=r, mesh_time=0., rocktab_time=0., error=None)
+               for m, r in zip(mesh_files, rocktab_files)]
+    # Parse the rock tables once each in this process
+    rocktabs = []
+    for report in reports:
+        start = time.perf_counter()
         try:
-            data = pd.read_table(filename, delim_whitespace=True)
-        except (FileNotFoundError, IOError, OSError):
-            raise RuntimeError('File ("{}") not found.'.format(filename))
-        # Now use spatial refernce data to reconstruct the TensorMesh
-        #- The array titles that should always be present and that we will use
-        refs = ['index', 'i', 'j', 'k', 'x', 'dx', 'y', 'dy', 'z', 'dz', 'element_ref', 'nuft_ind', 'volume']
-        #- subtract one from indexing arrays because someone chose +1 indexing :(
-        if fix_indices:
-            data['index'] -= 1
-            data['i'] -= 1
-            data['j'] -= 1
-            data['k'] -= 1
-            data['element_ref'] -= 1
-            data['nuft_ind'] -= 1
-        #- Get the tensors on each axis
-        xedge = data[data['j'] == 0]
-        xedge = xedge[xedge['k'] == 0]
-        yedge = data[data['i'] == 0]
-        yedge = yedge[yedge['k'] == 0]
-        zedge = data[data['i'] == 0]
-        zedge = zedge[zedge['j'] == 0]
-        xt = xedge['dx'].values
-        yt = yedge['dy'].values
-        zt = zedge['dz'].values
-        # Find the origin
-        odx = xedge[xedge['j'] == 0]
-        ox = (odx['x'] - odx['dx']/2.).values[0]
-        ody = yedge[yedge['i'] == 0]
-        oy = (ody['y'] - ody['dy']/2.).values[0]
-        odz = xedge[xedge['j'] == 0]
-        oz = (odz['z'] - odz['dz']/2.).values[0]
-        # Construct the TensorMesh
-        mesh = TensorMesh([xt, yt, zt], x0=(ox, oy, oz))
-        # Make a model dictionary
-        data = data[[k for k in data.keys() if k not in refs]]
-        models = dict()
-        # Validate the mesh and models
-        #TODO: mesh.validate()
-        for name in data.keys():
-            mod = data[name].values
-            if mod.size != mesh.nC:
-                raise RuntimeError('Number of elements ({}) in data array does not match number of cells ({}) in the mesh.'.format(mod.size, mesh.nC))
-            models[name] = mod
-        # Return the constructed mesh and models
-        return mesh, models
+            rocktabs.append(_read_rocktab_cached(report['rocktab'], **kwargs))
+        except Exception as e:
+            rocktabs.append(None)
+            report['error'] = '{}: {}'.format(type(e).__name__, e)
+        report['rocktab_time'] = time.perf_counter() - start
+    # Now parse the meshes
+    tasks = [(fname, compact, kwargs) for fname in mesh_files]
+    if workers == 1 or len(tasks) < 2:
+        outputs = [_read_genmsh_task(task) for task in tasks]
+    else:
+        outputs = []
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            futures = [pool.submit(_read_genmsh_task, task) for task in tasks]
+            for future in futures:
+                try:
+                    outputs.append(future.result())
+                except Exception as e:
+                    outputs.append((None, '{}: {}'.format(type(e).__name__, e), 0.))
+    results = []
+    for report, rocktab, (specs, error, elapsed) in zip(reports, rocktabs, outputs):
+        report['mesh_time'] = elapsed
+        report['error'] = report['error'] or error
+        if report['error'] is not None:
+            results.append(None)
+        elif compact:
+            specs['rocktab'] = rocktab
+            results.append(specs)
+        else:
+            specs.rocktab = rocktab
+            results.append(specs)
+    return results, reports
+
+def read_tab(filename, comments=';', skiprows=0, opener='(', closer=')', names=None, structured=False, iterator=False):
+    """Reads the NUFT table data format (``.tab`` files). With ``iterator``
+    a generator of the tables is returned to process one table at a time."""
+    if iterator:
+        return Parser.iter_tab_file(filename, comments=comments, skiprows=skiprows, opener=opener, closer=closer, names=names, structured=structured)
+    return Parser.parse_tab_file(filename, comments=comments, skiprows=skiprows, opener=opener, closer=closer, names=names, structured=structured)
+
+
+def _run_length(values):
+    """Compresses an array of values to ``n*value`` tokens. The runs are
+    found with one comparison of the whole array."""
+    values = np.asarray(values, dtype=float).ravel()
+    if values.size < 1:
+        return []
+    starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+    counts = np.diff(np.r_[starts, values.size])
+    return ['{}*{!r}'.format(n, v) if n > 1 else repr(v)
+            for n, v in zip(counts.tolist(), values[starts].tolist())]
+
+
+def _wrap(tokens, indent, per_line=8):
+    """Joins tokens with at most ``per_line`` tokens on every line"""
+    lines = [' '.join(tokens[i:i + per_line]) for i in range(0, len(tokens), per_line)]
+    return ('\n' + indent).join(lines)
+
+
+def _genmsh_lines(specs):
+    """Gets the lines of the ``genmsh`` block of a ``MeshSpecifications``"""
+    lines = ['(genmsh']
+    if specs.coord is not None:
+        lines.append('  (coord {})'.format(specs.coord))
+    if specs.down is not None:
+        lines.append('  (down {})'.format(' '.join(repr(float(v)) for v in specs.down)))
+    for ax in ['dx', 'dy', 'dz']:
+        lines.append('  ({} {})'.format(ax, _wrap(_run_length(getattr(specs, ax)), '    ')))
+    # Write the boxes in the order they are painted (+1 indexed)
+    components = specs.components
+    if len(components):
+        lines.append('  (mat')
+        boxes = (specs.boxes.astype(np.int64) + 1).tolist()
+        for box, idx in zip(boxes, specs.box_components.tolist()):
+            lines.append('    ({} {} {} {} {} {} {} {})'.format(*(components[idx] + tuple(box))))
+        lines.append('  )')
+    lines.append(')')
+    return lines
+
+
+def _rocktab_lines(rocktab):
+    """Gets the lines of the ``rocktab`` block of a dictionary of ``RockType``"""
+    lines = ['(rocktab']
+    for mat_type, rt in rocktab.items():
+        lines.append('  ({}'.format(mat_type))
+        for key, prop in RockType._props.items():
+            if isinstance(prop, properties.Float):
+                value = rt._get(key)
+                if value is not None:
+                    lines.append('    ({} {!r})'.format(key.replace('_', '-'), float(value)))
+        for key, prop in RockType._props.items():
+            if not isinstance(prop, properties.List):
+                continue
+            records = rt.records(key)
+            if len(records) < 1:
+                continue
+            if key in ['Kd', 'KdFactor']:
+                entries = ['({} {!r})'.format(r.name, float(r.value)) for r in records]
+            else:
+                entries = []
+                for r in records:
+                    head = [r.phase] if r.equation is None else [r.phase, r.equation]
+                    params = ['({} {!r})'.format(p.name, float(p.value)) for p in r.params]
+                    entries.append('({})'.format(' '.join(head + params)))
+            lines.append('    ({} {})'.format(key, ' '.join(entries)))
+        lines.append('  )')
+    lines.append(')')
+    return lines
+
+
+def _write_lines(filename, lines):
+    """Writes lines of text to a file name or file-like object in one call"""
+    text = '\n'.join(lines) + '\n'
+    if hasattr(filename, 'write'):
+        filename.write(text)
+        return
+    with io.open(filename, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def write_genmsh(filename, specs):
+    """Writes ``MeshSpecifications`` (or ``USNT``) to a genmsh file. Repeated
+    widths are compressed to the ``n*value`` notation.
+
+    Args:
+        filename (str): the file name or a file-like object to write to
+        specs (MeshSpecifications): the mesh specifications to write
+
+    """
+    _write_lines(filename, _genmsh_lines(specs))
+
+
+def write_rocktab(filename, rocktab):
+    """Writes a dictionary of ``RockType`` (e.g. from :func:`read_rocktab`) to
+    a rocktab file.
+
+    Args:
+        filename (str): the file name or a file-like object to write to
+        rocktab (dict): the rock types of every material type
+
+    """
+    _write_lines(filename, _rocktab_lines(rocktab))
+
+
+def write_usnt(filename, usnt, fname_rtab=None):
+    """Writes a ``USNT`` object to NUFT syntax. The ``genmsh`` and ``rocktab``
+    blocks are written to one deck unless ``fname_rtab`` is given.
+
+    Args:
+        filename (str): the file name or a file-like object for the mesh
+        usnt (USNT): the mesh specifications and rock properties to write
+        fname_rtab (str): If given, write the rocktab to this file
+
+    """
+    if fname_rtab is None:
+        _write_lines(filename, _genmsh_lines(usnt) + [''] + _rocktab_lines(usnt.rocktab))
+        return
+    _write_lines(filename, _genmsh_lines(usnt))
+    _write_lines(fname_rtab, _rocktab_lines(usnt.rocktab))
+
+
+#- The results readers that moved to :mod:`~nuftio.results`
+_RESULTS = ['NuftMesh', 'NuftLayout', 'read_nuft_series', 'reduce_nuft_series', 'SeriesStatistics']
+
+
+def __getattr__(name):
+    """Keeps the results readers importable from this module without
+    importing ``discretize`` and ``pandas`` until they are used"""
+    if name in _RESULTS:
+        from . import results
+        return getattr(results, name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
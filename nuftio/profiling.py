@@ -0,0 +1,170 @@
+"""Timing instrumentation for the read pipeline. The named phases of a read
+(``read``, ``tokenize``, ``to_dict``, ``create_specs``, ``validate``,
+``mesh_reconstruct``, ``model_build``, ...) are timed with
+``time.perf_counter`` and counted (bytes, tokens, rows, boxes). Collect them
+with :func:`profile`, any callback given to :func:`add_hook` or the
+``logging`` module by setting the ``nuftio`` logger to ``DEBUG``. With no
+hooks and logging off a phase costs one check.
+"""
+from __future__ import print_function
+
+__displayname__ = 'Profiling'
+
+__all__ = [
+    'PhaseRecord',
+    'Profile',
+    'add_hook',
+    'phase',
+    'profile',
+    'remove_hook',
+]
+
+import collections
+import logging
+import time
+
+
+logger = logging.getLogger('nuftio')
+
+#- The callbacks given every ``PhaseRecord``
+_HOOKS = []
+
+
+PhaseRecord = collections.namedtuple('PhaseRecord', ['name', 'seconds', 'counts', 'message'])
+PhaseRecord.__doc__ = """The time and counters of one named phase. The
+``message`` is a human readable summary (e.g. of a validation)."""
+
+
+def add_hook(func):
+    """Calls ``func`` with the :class:`PhaseRecord` of every finished phase"""
+    _HOOKS.append(func)
+    return func
+
+
+def remove_hook(func):
+    """Stops calling a hook given to :func:`add_hook`"""
+    if func in _HOOKS:
+        _HOOKS.remove(func)
+
+
+def _emit(record):
+    for func in list(_HOOKS):
+        func(record)
+    if logger.isEnabledFor(logging.DEBUG):
+        counts = ' '.join('{}={}'.format(k, v) for k, v in record.counts.items())
+        logger.debug('%s: %.6f s %s%s', record.name, record.seconds, counts,
+                     ' ({})'.format(record.message) if record.message else '')
+
+
+class _Phase(object):
+    """Times a block of code and emits its record on exit"""
+    __slots__ = ('name', 'counts', 'message', 'start')
+
+    def __init__(self, name, counts):
+        self.name = name
+        self.counts = counts
+        self.message = None
+        self.start = None
+
+    def count(self, **counts):
+        """Adds to the counters of the phase"""
+        for k, v in counts.items():
+            self.counts[k] = self.counts.get(k, 0) + v
+
+    def note(self, message):
+        """Sets the summary message of the phase"""
+        self.message = message
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        _emit(PhaseRecord(self.name, time.perf_counter() - self.start, self.counts, self.message))
+        return False
+
+
+class _NullPhase(object):
+    """The phase used when instrumentation is off"""
+    __slots__ = ()
+
+    def count(self, **counts):
+        pass
+
+    def note(self, message):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_NULL = _NullPhase()
+
+
+def phase(name, **counts):
+    """A context manager timing a named phase. Counters can be given here or
+    added with ``count(**counts)`` on the returned object inside the block
+    and a summary message can be set with ``note(message)``.
+
+    Example:
+        >>> with phase('tokenize', bytes=len(text)) as p:
+        ...     tokens = text.split()
+        ...     p.count(tokens=len(tokens))
+
+    """
+    if not _HOOKS and not logger.isEnabledFor(logging.DEBUG):
+        return _NULL
+    return _Phase(name, counts)
+
+
+class Profile(object):
+    """Collects the :class:`PhaseRecord` of every phase while active"""
+
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def __enter__(self):
+        add_hook(self)
+        return self
+
+    def __exit__(self, *args):
+        remove_hook(self)
+        return False
+
+    def summary(self):
+        """Gets the number of calls, total seconds and summed counters of
+        every phase name in order of first appearance"""
+        out = collections.OrderedDict()
+        for rec in self.records:
+            agg = out.setdefault(rec.name, dict(calls=0, seconds=0.))
+            agg['calls'] += 1
+            agg['seconds'] += rec.seconds
+            for k, v in rec.counts.items():
+                agg[k] = agg.get(k, 0) + v
+        return out
+
+    def report(self):
+        """Gets the :meth:`summary` as a table of text"""
+        lines = ['{:<20} {:>6} {:>12}  {}'.format('phase', 'calls', 'seconds', 'counts')]
+        for name, agg in self.summary().items():
+            counts = ' '.join('{}={}'.format(k, v) for k, v in agg.items() if k not in ['calls', 'seconds'])
+            lines.append('{:<20} {:>6} {:>12.6f}  {}'.format(name, agg['calls'], agg['seconds'], counts))
+        return '\n'.join(lines)
+
+
+def profile():
+    """Gets a :class:`Profile` context manager that collects the phases of
+    everything read inside the block.
+
+    Example:
+        >>> with nuftio.profile() as prof:
+        ...     usnt = nuftio.read_usnt('genmsh.in', 'rocktab.in')
+        >>> print(prof.report())
+
+    """
+    return Profile()
@@ -0,0 +1,825 @@
+"""This module holds the readers of NUFT simulation results: the
+``TensorMesh`` reconstruction of a results table, the layouts reused across
+the snapshots of a run and the time series readers and reductions.
+"""
+from __future__ import print_function
+
+__displayname__ = 'Results'
+
+__all__ = [
+    'NuftMesh',
+    'NuftLayout',
+    'read_nuft_series',
+    'reduce_nuft_series',
+    'SeriesStatistics',
+]
+
+import discretize
+import pandas as pd
+import numpy as np
+import os
+import io
+import sys
+import glob
+import json
+import shutil
+import tempfile
+import warnings
+import collections
+import concurrent.futures
+
+
+from .spec import _rectilinear_grid
+from . import profiling
+from . import tables
+
+
+class NuftMesh(discretize.TensorMesh):
+    """This is an extension of ``discretize``s ``TensorMesh`` to provide
+    file IO for NUFT simulation results"""
+
+
+    CACHE_VERSION = 1
+    #- The array titles that should always be present and that we will use
+    REFERENCES = ['index', 'i', 'j', 'k', 'x', 'dx', 'y', 'dy', 'z', 'dz', 'element_ref', 'nuft_ind', 'volume']
+    GEOMETRY = ['i', 'j', 'k', 'x', 'dx', 'y', 'dy', 'z', 'dz']
+
+    @staticmethod
+    def _cache_dir(filename, cache):
+        """Gets the sidecar cache directory for a results file"""
+        if isinstance(cache, str):
+            return cache
+        return '{}.nuftio'.format(filename)
+
+    @staticmethod
+    def _source_key(filename):
+        """The path, size and modification time identifying a results file"""
+        stat = os.stat(filename)
+        return dict(path=os.path.abspath(filename), size=stat.st_size,
+                    mtime=stat.st_mtime, version=NuftMesh.CACHE_VERSION)
+
+    @classmethod
+    def _load_cache(TensorMesh, filename, cache_dir):
+        """Loads a mesh and memory-mapped models from a sidecar cache. Returns
+        ``None`` if the cache is missing, stale or corrupt."""
+        try:
+            with open(os.path.join(cache_dir, 'meta.json'), 'r') as f:
+                meta = json.load(f)
+            if meta['source'] != NuftMesh._source_key(filename):
+                return None
+            load = lambda name: np.load(os.path.join(cache_dir, name), mmap_mode='r')
+            h = [np.array(load('h{}.npy'.format(ax))) for ax in 'xyz']
+            mesh = TensorMesh(h, x0=np.array(load('origin.npy')))
+            models = dict()
+            for idx, name in enumerate(meta['models']):
+                models[name] = load('model_{}.npy'.format(idx))
+                if models[name].size != mesh.nC:
+                    return None
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+        return mesh, models
+
+    @staticmethod
+    def _write_cache(filename, cache_dir, mesh, models):
+        """Writes a mesh and its models as ``.npy`` files in a sidecar cache
+        directory. The directory is swapped in whole so readers never see a
+        partially written cache."""
+        parent = os.path.dirname(os.path.abspath(cache_dir))
+        tmp = None
+        try:
+            tmp = tempfile.mkdtemp(dir=parent, prefix='.nuftio-')
+            for ax, h in zip('xyz', mesh.h):
+                np.save(os.path.join(tmp, 'h{}.npy'.format(ax)), h)
+            np.save(os.path.join(tmp, 'origin.npy'), mesh.x0)
+            names = list(models.keys())
+            for idx, name in enumerate(names):
+                np.save(os.path.join(tmp, 'model_{}.npy'.format(idx)), models[name])
+            meta = dict(source=NuftMesh._source_key(filename), models=names)
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            if os.path.isdir(cache_dir):
+                shutil.rmtree(cache_dir)
+            os.rename(tmp, cache_dir)
+        except (IOError, OSError) as e:
+            warnings.warn('Could not write the results cache ("{}"): {}'.format(cache_dir, e))
+            if tmp is not None:
+                shutil.rmtree(tmp, ignore_errors=True)
+
+    @staticmethod
+    def _read_header(filename):
+        """Reads the column names of a NUFT results table"""
+        try:
+            with open(filename, 'r') as f:
+                return f.readline().split()
+        except (IOError, OSError):
+            raise RuntimeError('File ("{}") not found.'.format(filename))
+
+    @staticmethod
+    def _count_rows(filename, chunksize=16 * 1024**2):
+        """Counts the data rows of a results table (an upper bound when the
+        file has blank lines) without parsing it."""
+        rows, last = 0, b'\n'
+        with open(filename, 'rb') as f:
+            for data in iter(lambda: f.read(chunksize), b''):
+                rows += data.count(b'\n')
+                last = data[-1:]
+        if last != b'\n':
+            rows += 1
+        return rows - 1
+
+    @classmethod
+    def read_nuft(TensorMesh, filename, fix_indices=True, cache=False, variables=None, chunksize=None,
+                  window=None, bounds=None, layout=None, threads=None):
+        """Reads a NUFT results table into a ``TensorMesh`` and a dictionary
+        of the models on that mesh. The mesh is reconstructed from the integer
+        ``i``, ``j``, ``k`` columns and every row is scattered to its cell so
+        the rows may be in any order. Cells missing from the file (e.g. a
+        partial dump of a running simulation) are NaN.
+
+        Args:
+            filename (str): the relative or absolute file name
+            fix_indices (bool): If True, decrease the indexing arrays by one
+                because someone chose to use +1 indexing in the NUFT format.
+            cache (bool or str): If True, store the mesh and models as
+                ``.npy`` files in a ``<filename>.nuftio`` directory next to the
+                file (or in the directory given as a string). Later reads of
+                an unchanged file (same path, size and modification time)
+                return memory-mapped models from that cache. A stale or corrupt
+                cache is rebuilt.
+            variables (list(str)): the names of the model variables to read.
+                Only these and the geometry columns are parsed. Defaults to
+                all variables in the file.
+            chunksize (int): If given, parse the table this many rows at a
+                time and fill preallocated model arrays so that the full
+                table is never held in memory.
+            window (tuple): a region of interest as zero based, inclusive
+                ``((i0, i1), (j0, j1), (k0, k1))`` cell indices
+            bounds (tuple): a region of interest as a bounding box
+                ``((xmin, xmax), (ymin, ymax), (zmin, zmax))``. Cells touching
+                the box are kept.
+            layout (NuftLayout): the layout of an earlier snapshot of the
+                same run. The geometry columns are not parsed and the mesh and
+                region of the layout are used.
+            threads (int): If given, parse the table with the pandas-free
+                reader of :mod:`nuftio.tables` in this many threads rather
+                than with ``pandas.read_table``.
+
+        With a ``window`` and/or ``bounds`` only the sub-mesh and the values
+        in that region are returned. The rows outside the region are dropped
+        as each chunk is parsed so memory scales with the region size.
+
+        """
+        header = NuftMesh._read_header(filename)
+        if variables is None:
+            variables = [k for k in header if k not in NuftMesh.REFERENCES]
+        elif isinstance(variables, str):
+            variables = [variables]
+        missing = [k for k in variables if k not in header]
+        if missing:
+            raise RuntimeError('Variables ({}) not found in the file ("{}").'.format(missing, filename))
+        if layout is not None:
+            if window is not None or bounds is not None:
+                raise RuntimeError('The region of interest of a ``layout`` is set in ``NuftLayout.from_file``.')
+            return layout.mesh(), layout.read(filename, variables=variables, chunksize=chunksize,
+                                              threads=threads)
+        if cache:
+            cache_dir = NuftMesh._cache_dir(filename, cache)
+            cached = TensorMesh._load_cache(filename, cache_dir)
+            if cached is None:
+                # Always cache every variable of the file
+                cached = TensorMesh.read_nuft(filename, fix_indices=fix_indices, chunksize=chunksize,
+                                              threads=threads)
+                TensorMesh._write_cache(filename, cache_dir, *cached)
+            mesh, models = cached
+            models = {name: models[name] for name in variables}
+            if window is not None or bounds is not None:
+                return NuftMesh._window_models(mesh, models, window=window, bounds=bounds)
+            return mesh, models
+        mesh, models, cells, _ = TensorMesh._read_rows(filename, variables, fix_indices=fix_indices,
+                                                        chunksize=chunksize, window=window, bounds=bounds,
+                                                        threads=threads)
+        # Scatter the models into cell order
+        with profiling.phase('model_build', models=len(variables), cells=mesh.nC):
+            for name in variables:
+                models[name] = NuftMesh._scatter(models[name], cells, mesh.nC)
+        # Return the constructed mesh and models
+        return mesh, models
+
+    @classmethod
+    def _read_rows(TensorMesh, filename, variables, fix_indices=True, chunksize=None,
+                   window=None, bounds=None, track_rows=False, threads=None):
+        """Parses the geometry and the given variables of a results table.
+        Returns the reconstructed mesh, the variables in row order, the linear
+        cell index of every row and (with ``track_rows``) the position of
+        every row in the file."""
+        usecols = NuftMesh.GEOMETRY + [k for k in variables if k not in NuftMesh.GEOMETRY]
+        with profiling.phase('read') as ph:
+            reader = NuftMesh._iter_columns(filename, usecols, chunksize=chunksize, threads=threads)
+            if chunksize is None:
+                capacity = None
+            elif window is not None or bounds is not None:
+                # Start small and grow with the region
+                capacity = chunksize
+                if window is not None:
+                    capacity = min(capacity, int(np.prod([hi - lo + 1 for lo, hi in window])))
+            else:
+                capacity = NuftMesh._count_rows(filename)
+            # Now use spatial refernce data to reconstruct the TensorMesh
+            keys, positions, models, axes = None, None, None, ([], [], [])
+            rows = seen = 0
+            for data in reader:
+                n = len(data['i'])
+                #- subtract one from indexing arrays because someone chose +1 indexing :(
+                ijk = [data[ind].astype(np.int64) - int(fix_indices) for ind in ['i', 'j', 'k']]
+                if any(ind.size and ind.min() < 0 for ind in ijk):
+                    raise RuntimeError('Negative cell indices found. Check the ``fix_indices`` argument.')
+                #- Drop the rows outside of the region of interest
+                keep = NuftMesh._in_region(data, ijk, window, bounds)
+                pos = np.arange(seen, seen + n) if track_rows else None
+                seen += n
+                if keep is not None:
+                    data = {c: col[keep] for c, col in data.items()}
+                    n = int(np.count_nonzero(keep))
+                    ijk = [ind[keep] for ind in ijk]
+                    pos = pos[keep] if track_rows else None
+                #- Only keep the first width and center of each index on every axis
+                for ax, ind, c in zip(axes, ijk, ['x', 'y', 'z']):
+                    uniq, first = np.unique(ind, return_index=True)
+                    ax.append((uniq, data['d' + c][first], data[c][first]))
+                packed = NuftMesh._pack(*ijk)
+                if capacity is None:
+                    keys, positions = packed, pos
+                    models = {name: data[name] for name in variables}
+                else:
+                    if models is None:
+                        keys = np.empty(capacity, dtype=np.int64)
+                        positions = np.empty(capacity, dtype=np.int64) if track_rows else None
+                        models = {name: np.empty(capacity) for name in variables}
+                    if rows + n > len(keys):
+                        # Grow the buffers for regions of unknown size
+                        capacity = max(2 * len(keys), rows + n)
+                        keys = NuftMesh._grow(keys, capacity)
+                        positions = NuftMesh._grow(positions, capacity) if track_rows else None
+                        models = {name: NuftMesh._grow(mod, capacity) for name, mod in models.items()}
+                    keys[rows:rows + n] = packed
+                    if track_rows:
+                        positions[rows:rows + n] = pos
+                    for name in variables:
+                        models[name][rows:rows + n] = data[name]
+                rows += n
+            ph.count(rows=seen, kept=rows)
+        if rows < 1:
+            raise RuntimeError('No cells found in the file ("{}").'.format(filename))
+        with profiling.phase('mesh_reconstruct', cells=rows):
+            #- Get the tensors and origin on each axis
+            tensors, origin, offset = zip(*[NuftMesh._axis_tensor(ax, name) for ax, name in zip(axes, 'xyz')])
+            # Construct the TensorMesh
+            mesh = TensorMesh(list(tensors), x0=origin)
+            cells = NuftMesh._linear_index(keys[:rows], mesh.vnC, offset)
+        models = {name: mod[:rows] for name, mod in models.items()}
+        if track_rows:
+            positions = (positions[:rows], seen)
+        return mesh, models, cells, positions
+
+    def write_nuft(self, filename, models, fix_indices=True, chunksize=1000000):
+        """Writes the mesh and models to a NUFT results table in the layout
+        read by :meth:`read_nuft`. Every cell is one row in cell order and
+        the table is written ``chunksize`` rows at a time.
+
+        Args:
+            filename (str): the file name or a file-like object to write to
+            models (dict): the models to write as variable columns
+            fix_indices (bool): If True, write +1 indexed ``i``, ``j``, ``k``
+
+        """
+        for name, mod in models.items():
+            if np.size(mod) != self.nC:
+                raise RuntimeError('Model ({}) does not have a value for every cell.'.format(name))
+        # The cell centers and widths on each axis
+        centers = [o + np.cumsum(h) - h / 2. for o, h in zip(self.x0, self.h)]
+        shift = int(fix_indices)
+        close = not hasattr(filename, 'write')
+        f = io.open(filename, 'w') if close else filename
+        try:
+            for start in range(0, self.nC, chunksize):
+                idx = np.arange(start, min(start + chunksize, self.nC))
+                ijk = np.unravel_index(idx, self.vnC, order='F')
+                columns = collections.OrderedDict([('index', idx + 1)])
+                for c, ind in zip(['i', 'j', 'k'], ijk):
+                    columns[c] = ind + shift
+                for c, ind, cc, h in zip(['x', 'y', 'z'], ijk, centers, self.h):
+                    columns[c] = cc[ind]
+                    columns['d' + c] = h[ind]
+                columns['element_ref'] = idx + 1
+                columns['nuft_ind'] = idx + 1
+                columns['volume'] = columns['dx'] * columns['dy'] * columns['dz']
+                for name, mod in models.items():
+                    columns[name] = np.asarray(mod).ravel()[start:start + len(idx)]
+                pd.DataFrame(columns).to_csv(f, sep=' ', index=False, header=start == 0,
+                                             na_rep='nan')
+        finally:
+            if close:
+                f.close()
+
+    def to_rectilinear_grid(self, models=None, filename=None):
+        """Create a PyVista ``RectilinearGrid`` of the mesh with the given
+        dictionary of models (e.g. from :meth:`read_nuft`) attached as cell
+        arrays without copying them.
+
+        Args:
+            models (dict): the models to attach to the cells
+            filename (str): If given, also save the grid to this file
+                (e.g. ``results.vtr``)
+
+        """
+        return _rectilinear_grid(self.h, origin=self.x0, cell_data=models, filename=filename)
+
+    @staticmethod
+    def _iter_columns(filename, usecols, chunksize=None, threads=None):
+        """Iterates over the chunks of ``chunksize`` rows (or the whole table)
+        of a results table as dictionaries of the ``usecols`` arrays. Pandas
+        parses the table unless a number of ``threads`` is given."""
+        if threads is None:
+            reader = pd.read_table(filename, delim_whitespace=True, usecols=usecols, chunksize=chunksize)
+            if chunksize is None:
+                reader = [reader]
+            for data in reader:
+                yield {c: data[c].values for c in usecols}
+            return
+        dtypes = {c: np.int64 for c in ['i', 'j', 'k'] if c in usecols}
+        if chunksize is None:
+            yield tables.read_columns(filename, usecols=usecols, threads=threads, dtypes=dtypes)
+            return
+        # The byte ranges hold about ``chunksize`` rows of the size of the first
+        with io.open(filename, 'rb') as f:
+            f.readline()
+            row_bytes = max(len(f.readline()), 1)
+        for data in tables.iter_columns(filename, usecols=usecols, threads=threads, dtypes=dtypes,
+                                        range_bytes=chunksize * row_bytes):
+            yield data
+
+    @staticmethod
+    def _grow(arr, capacity):
+        """Copies an array into a larger buffer"""
+        out = np.empty(capacity, dtype=arr.dtype)
+        out[:len(arr)] = arr
+        return out
+
+    @staticmethod
+    def _in_region(data, ijk, window, bounds):
+        """Gets the mask of the rows in a window of cell indices and/or
+        touching a bounding box in coordinates (``None`` for all rows)."""
+        keep = None
+        if window is not None:
+            keep = np.ones(len(ijk[0]), dtype=bool)
+            for ind, (lo, hi) in zip(ijk, window):
+                keep &= (ind >= lo) & (ind <= hi)
+        if bounds is not None:
+            if keep is None:
+                keep = np.ones(len(ijk[0]), dtype=bool)
+            for c, (lo, hi) in zip(['x', 'y', 'z'], bounds):
+                center, half = data[c], data['d' + c] / 2.
+                keep &= (center + half >= lo) & (center - half <= hi)
+        return keep
+
+    @staticmethod
+    def _window_models(mesh, models, window=None, bounds=None):
+        """Cuts a region of interest out of a full mesh and its models. Only
+        the values inside the region are read from memory-mapped models."""
+        ranges = []
+        for ax, (h, o) in enumerate(zip(mesh.h, mesh.x0)):
+            lo, hi = 0, len(h) - 1
+            if window is not None:
+                lo, hi = max(lo, window[ax][0]), min(hi, window[ax][1])
+            if bounds is not None:
+                nodes = o + np.concatenate([[0.], np.cumsum(h)])
+                inside = np.flatnonzero((nodes[1:] >= bounds[ax][0]) & (nodes[:-1] <= bounds[ax][1]))
+                if inside.size < 1:
+                    hi = lo - 1
+                else:
+                    lo, hi = max(lo, inside[0]), min(hi, inside[-1])
+            if hi < lo:
+                raise RuntimeError('No cells found in the region of interest.')
+            ranges.append(slice(lo, hi + 1))
+        h = [h[sl] for h, sl in zip(mesh.h, ranges)]
+        origin = [o + hx[:sl.start].sum() for o, hx, sl in zip(mesh.x0, mesh.h, ranges)]
+        sub = type(mesh)(h, x0=origin)
+        out = dict()
+        for name, mod in models.items():
+            out[name] = np.ascontiguousarray(mod.reshape(mesh.vnC, order='F')[tuple(ranges)]).ravel(order='F')
+        return sub, out
+
+    _PACK_BITS = 21
+
+    @staticmethod
+    def _pack(i, j, k):
+        """Packs the i, j, k cell indices into one integer per row before the
+        mesh shape is known."""
+        bits = NuftMesh._PACK_BITS
+        return i | (j << bits) | (k << (2 * bits))
+
+    @staticmethod
+    def _linear_index(keys, shape, offset=(0, 0, 0)):
+        """Unpacks the i, j, k cell indices and computes the Fortran ordered
+        linear cell index of every row relative to the first cell at the
+        ``offset`` indices."""
+        bits = NuftMesh._PACK_BITS
+        mask = (1 << bits) - 1
+        nx, ny, _ = shape
+        i0, j0, k0 = offset
+        return ((keys & mask) - i0) + nx * ((((keys >> bits) & mask) - j0) + ny * ((keys >> (2 * bits)) - k0))
+
+    @staticmethod
+    def _axis_tensor(parts, name):
+        """Reduces the ``(indices, widths, centers)`` found in every chunk to
+        the cell widths, origin and first index along one axis."""
+        ind = np.concatenate([p[0] for p in parts])
+        width = np.concatenate([p[1] for p in parts])
+        center = np.concatenate([p[2] for p in parts])
+        ind, first = np.unique(ind, return_index=True)
+        h = np.full(ind[-1] - ind[0] + 1, np.nan)
+        h[ind - ind[0]] = width[first]
+        if np.isnan(h).any():
+            raise RuntimeError('Cell widths along the {} axis are missing for indices: {}'.format(
+                name, np.flatnonzero(np.isnan(h)) + ind[0]))
+        o = center[first[0]] - h[0] / 2.
+        return h, o, ind[0]
+
+    @staticmethod
+    def _scatter(values, cells, n_cells):
+        """Places the values of every row at its linear cell index. Cells that
+        are not in the file are NaN. Rows already in cell order are returned
+        as they are."""
+        if values.size == n_cells and np.array_equal(cells, np.arange(n_cells)):
+            return values
+        mod = np.full(n_cells, np.nan)
+        mod[cells] = values
+        return mod
+
+
+class NuftLayout(object):
+    """The geometry of a NUFT results table that is shared by every snapshot
+    of a run: the mesh tensors and origin, the column names and the linear
+    cell index of every row of the file. Build it once from the first
+    snapshot with :meth:`from_file` and :meth:`read` later snapshots against
+    it so that the geometry columns are not converted and no geometry is
+    recomputed.
+
+    Rows outside the ``window``/``bounds`` the layout was built with have a
+    cell index of ``-1`` and are dropped when reading.
+    """
+
+    def __init__(self, h, origin, header, cells, fix_indices=True):
+        self.h = [np.asarray(t, dtype=float) for t in h]
+        self.origin = np.asarray(origin, dtype=float)
+        self.header = list(header)
+        self.cells = np.asarray(cells, dtype=np.int64)
+        self.fix_indices = fix_indices
+        self.n_cells = int(np.prod([len(t) for t in self.h]))
+        # Rows in cell order with every cell present need no scatter
+        self.identity = (self.cells.size == self.n_cells
+                         and np.array_equal(self.cells, np.arange(self.n_cells)))
+
+    @classmethod
+    def from_file(cls, filename, fix_indices=True, chunksize=None, window=None, bounds=None, threads=None):
+        """Builds the layout from the geometry columns of a results table.
+        The arguments are the same as :meth:`NuftMesh.read_nuft`."""
+        header = NuftMesh._read_header(filename)
+        mesh, _, cells, (positions, n_rows) = NuftMesh._read_rows(
+            filename, [], fix_indices=fix_indices, chunksize=chunksize,
+            window=window, bounds=bounds, track_rows=True, threads=threads)
+        rows = np.full(n_rows, -1, dtype=np.int64)
+        rows[positions] = cells
+        return cls(mesh.h, mesh.x0, header, rows, fix_indices=fix_indices)
+
+    @property
+    def n_rows(self):
+        """The number of rows in every snapshot of the run"""
+        return self.cells.size
+
+    @property
+    def variables(self):
+        """The names of the model variables in the table"""
+        return [k for k in self.header if k not in NuftMesh.REFERENCES]
+
+    def mesh(self):
+        """Creates the ``NuftMesh`` of the layout"""
+        return NuftMesh(self.h, x0=self.origin)
+
+    def read(self, filename, variables=None, chunksize=None, threads=None):
+        """Reads the models of a snapshot from the same run as this layout.
+        Each chunk of rows is scattered straight to its cells. Every byte of
+        the file is still scanned: with ``threads`` the tokens of the other
+        columns are only skipped by :mod:`nuftio.tables` and pandas tokenizes
+        every column before it drops the unused ones.
+
+        Args:
+            filename (str): the relative or absolute file name
+            variables (list(str)): the variables to read (defaults to all)
+            chunksize (int): parse this many rows at a time
+            threads (int): parse with :mod:`nuftio.tables` in this many threads
+
+        Return:
+            dict: the models of every variable on the layout's mesh
+
+        """
+        header = NuftMesh._read_header(filename)
+        if header != self.header:
+            raise RuntimeError('The columns of ("{}") do not match the layout.'.format(filename))
+        if variables is None:
+            variables = self.variables
+        elif isinstance(variables, str):
+            variables = [variables]
+        missing = [k for k in variables if k not in header]
+        if missing:
+            raise RuntimeError('Variables ({}) not found in the file ("{}").'.format(missing, filename))
+        if not variables:
+            return dict()
+        reader = NuftMesh._iter_columns(filename, variables, chunksize=chunksize, threads=threads)
+        if self.identity:
+            models = {name: np.empty(self.n_cells) for name in variables}
+        else:
+            models = {name: np.full(self.n_cells, np.nan) for name in variables}
+        seen = 0
+        with profiling.phase('read', models=len(variables)) as ph:
+            for data in reader:
+                n = len(data[variables[0]])
+                if seen + n > self.n_rows:
+                    seen += n
+                    break
+                cells = self.cells[seen:seen + n]
+                if self.identity:
+                    for name in variables:
+                        models[name][seen:seen + n] = data[name]
+                else:
+                    keep = cells >= 0
+                    for name in variables:
+                        models[name][cells[keep]] = data[name][keep]
+                seen += n
+            ph.count(rows=seen)
+        if seen == self.n_rows:
+            return models
+        raise RuntimeError('The number of rows of ("{}") does not match the layout ({}).'.format(
+            filename, self.n_rows))
+
+    def __repr__(self):
+        return '<NuftLayout: {} rows, {} cells>'.format(self.n_rows, self.n_cells)
+
+
+def _nuft_paths(paths):
+    """Expands a glob pattern or list of file names to a list of files"""
+    if isinstance(paths, str):
+        if os.path.isfile(paths):
+            return [paths]
+        paths = sorted(glob.glob(paths))
+    paths = list(paths)
+    if len(paths) < 1:
+        raise RuntimeError('No NUFT results files found.')
+    return paths
+
+
+_LAYOUT = None
+
+
+def _set_layout(layout):
+    """Shares the layout of a series with a worker process once"""
+    global _LAYOUT
+    _LAYOUT = layout
+
+
+def _read_snapshot(args):
+    """Reads one snapshot of a series in a worker process. When given the
+    ``.npy`` files of the stacked outputs, the models are written straight
+    into row ``t`` of those memory maps rather than sent back. A layout may
+    be given as a seventh item of the task."""
+    filename, t, variables, fix_indices, chunksize, outputs = args[:6]
+    layout = args[6] if len(args) > 6 else _LAYOUT
+    mesh, models = NuftMesh.read_nuft(filename, fix_indices=fix_indices, variables=variables,
+                                      chunksize=chunksize, layout=layout)
+    if outputs is not None:
+        for name, fname in outputs.items():
+            stack = np.lib.format.open_memmap(fname, mode='r+')
+            stack[t] = models[name]
+            stack.flush()
+            del stack
+        models = None
+    return mesh.h, mesh.x0, models
+
+
+def _check_mesh(mesh, h, x0, fname, reference):
+    """Raises an error if a snapshot's widths and origin differ from a mesh"""
+    if (any(len(a) != len(b) or not np.allclose(a, b) for a, b in zip(h, mesh.h))
+            or not np.allclose(x0, mesh.x0)):
+        raise RuntimeError('The mesh of ("{}") does not match the mesh of ("{}").'.format(fname, reference))
+
+
+def _iter_snapshots(tasks, workers, layout=None):
+    """Reads the snapshot tasks (in a process pool unless ``workers`` is 1)
+    and yields ``(filename, t, h, x0, models)`` in task order. At most a few
+    snapshots per worker are in flight so memory does not grow with the
+    length of the series. A ``layout`` is sent to every worker once."""
+    if workers == 1 or len(tasks) < 2:
+        _set_layout(layout)
+        try:
+            for task in tasks:
+                yield (task[0], task[1]) + _read_snapshot(task)
+        finally:
+            _set_layout(None)
+        return
+    workers = workers or os.cpu_count() or 1
+    kwargs = dict()
+    if layout is not None:
+        if sys.version_info >= (3, 7):
+            kwargs = dict(initializer=_set_layout, initargs=(layout,))
+        else:
+            # Pool initializers need Python 3.7: send the layout with every task
+            tasks = [task + (layout,) for task in tasks]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, **kwargs) as pool:
+        window = 2 * workers
+        pending = collections.deque()
+        for task in tasks:
+            pending.append((task, pool.submit(_read_snapshot, task)))
+            if len(pending) >= window:
+                task, future = pending.popleft()
+                yield (task[0], task[1]) + future.result()
+        while pending:
+            task, future = pending.popleft()
+            yield (task[0], task[1]) + future.result()
+
+
+def read_nuft_series(paths, variables=None, workers=None, fix_indices=True, chunksize=None, out=None,
+                     reuse_layout=False):
+    """Reads a time series of NUFT results snapshots that share one mesh.
+
+    The snapshots are parsed in a process pool and every variable is stacked
+    in a preallocated ``(n_times, nC)`` array in the order of ``paths``.
+
+    Args:
+        paths (str or list(str)): a glob pattern (sorted by name) or a list
+            of the results files in time order
+        variables (list(str)): the variables to read (defaults to all)
+        workers (int): the number of worker processes. Defaults to the number
+            of CPUs. Use ``1`` to read the snapshots in this process.
+        fix_indices (bool): passed to :meth:`NuftMesh.read_nuft`
+        chunksize (int): passed to :meth:`NuftMesh.read_nuft`
+        out (str): If given, a directory where each variable is written as a
+            memory-mapped ``<variable>.npy`` file. Workers write their rows
+            directly into these files.
+        reuse_layout (bool): If True, build a :class:`NuftLayout` from the
+            first snapshot and only parse the value columns of the others.
+            The geometry of the later snapshots is then not checked.
+
+    Return:
+        tuple: the ``NuftMesh`` and a dictionary of the stacked models
+
+    """
+    paths = _nuft_paths(paths)
+    # The first snapshot defines the mesh and the variables
+    layout = NuftLayout.from_file(paths[0], fix_indices=fix_indices, chunksize=chunksize) if reuse_layout else None
+    mesh, first = NuftMesh.read_nuft(paths[0], fix_indices=fix_indices, variables=variables,
+                                     chunksize=chunksize, layout=layout)
+    variables = list(first.keys())
+    shape = (len(paths), mesh.nC)
+    outputs = None
+    if out is not None:
+        if not os.path.isdir(out):
+            os.makedirs(out)
+        outputs = {name: os.path.join(out, '{}.npy'.format(name)) for name in variables}
+        models = {name: np.lib.format.open_memmap(fname, mode='w+', dtype=np.float64, shape=shape)
+                  for name, fname in outputs.items()}
+    else:
+        models = {name: np.empty(shape) for name in variables}
+    for name in variables:
+        models[name][0] = first[name]
+    del first
+    if out is not None:
+        for stack in models.values():
+            stack.flush()
+    # Now read the rest of the series
+    tasks = [(fname, t, variables, fix_indices, chunksize, outputs)
+             for t, fname in enumerate(paths) if t > 0]
+    for fname, t, h, x0, snap in _iter_snapshots(tasks, workers, layout=layout):
+        _check_mesh(mesh, h, x0, fname, paths[0])
+        if snap is not None:
+            for name in variables:
+                models[name][t] = snap[name]
+    return mesh, models
+
+
+class SeriesStatistics(object):
+    """Streaming per-cell statistics of one variable over a time series.
+
+    Every snapshot is folded into running accumulators with :meth:`update` so
+    memory does not depend on the number of timesteps: extremes and the time
+    they occurred, Welford updates for the mean and variance, the last value
+    and the first time the value reaches a threshold. NaN values (cells
+    missing from a snapshot) are ignored.
+    """
+
+    STATS = ('count', 'min', 'max', 'argmin', 'argmax', 'mean', 'var', 'std', 'final', 'first_crossing')
+
+    def __init__(self, n_cells, threshold=None):
+        self.threshold = threshold
+        self.count = np.zeros(n_cells, dtype=np.int64)
+        self.min = np.full(n_cells, np.nan)
+        self.max = np.full(n_cells, np.nan)
+        self.argmin = np.full(n_cells, np.nan)
+        self.argmax = np.full(n_cells, np.nan)
+        self.mean = np.zeros(n_cells)
+        self._m2 = np.zeros(n_cells)
+        self.final = np.full(n_cells, np.nan)
+        self.first_crossing = np.full(n_cells, np.nan)
+
+    def update(self, time, values):
+        """Folds the values of one snapshot at the given time into the
+        accumulators."""
+        valid = ~np.isnan(values)
+        self.count += valid
+        # Extremes and when they happened
+        lower = valid & ~(values >= self.min)
+        self.min[lower] = values[lower]
+        self.argmin[lower] = time
+        higher = valid & ~(values <= self.max)
+        self.max[higher] = values[higher]
+        self.argmax[higher] = time
+        # Welford's running moments
+        delta = np.where(valid, values - self.mean, 0.)
+        self.mean += np.where(valid, delta / np.maximum(self.count, 1), 0.)
+        self._m2 += np.where(valid, delta * (values - self.mean), 0.)
+        self.final[valid] = values[valid]
+        if self.threshold is not None:
+            crossed = valid & (values >= self.threshold) & np.isnan(self.first_crossing)
+            self.first_crossing[crossed] = time
+
+    @property
+    def var(self):
+        """The population variance of every cell"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 0, self._m2 / self.count, np.nan)
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+    def result(self, stats):
+        """Gets a dictionary of the requested statistics"""
+        out = dict()
+        for stat in stats:
+            if stat == 'mean':
+                out[stat] = np.where(self.count > 0, self.mean, np.nan)
+            else:
+                out[stat] = getattr(self, stat)
+        return out
+
+
+def reduce_nuft_series(paths, stats=('min', 'max', 'mean', 'var'), variables=None,
+                       threshold=None, times=None, workers=1, fix_indices=True, chunksize=None,
+                       reuse_layout=False):
+    """Computes per-cell statistics over a time series of NUFT results
+    without ever holding more than a few snapshots in memory.
+
+    Args:
+        paths (str or list(str)): a glob pattern (sorted by name) or a list
+            of the results files in time order
+        stats (list(str)): any of :attr:`SeriesStatistics.STATS`
+        variables (list(str)): the variables to reduce (defaults to all)
+        threshold (float or dict): the value (or a value per variable) for
+            the ``'first_crossing'`` statistic
+        times (array): the time of every snapshot used for ``'argmin'``,
+            ``'argmax'`` and ``'first_crossing'``. Defaults to the index.
+        workers (int): the number of processes parsing snapshots ahead of
+            the reduction (``None`` for the number of CPUs)
+        reuse_layout (bool): passed to :func:`read_nuft_series`
+
+    Return:
+        tuple: the ``NuftMesh`` and a dictionary of the statistics of every
+        variable: ``{variable: {stat_name: array}}``
+
+    """
+    for stat in stats:
+        if stat not in SeriesStatistics.STATS:
+            raise RuntimeError('Statistic ("{}") not valid. Use any of: {}'.format(stat, SeriesStatistics.STATS))
+    if 'first_crossing' in stats and threshold is None:
+        raise RuntimeError('A ``threshold`` is required for the first_crossing statistic.')
+    paths = _nuft_paths(paths)
+    if times is None:
+        times = np.arange(len(paths))
+    if len(times) != len(paths):
+        raise RuntimeError('The number of times ({}) does not match the number of files ({}).'.format(len(times), len(paths)))
+    layout = NuftLayout.from_file(paths[0], fix_indices=fix_indices, chunksize=chunksize) if reuse_layout else None
+    mesh, first = NuftMesh.read_nuft(paths[0], fix_indices=fix_indices, variables=variables,
+                                     chunksize=chunksize, layout=layout)
+    variables = list(first.keys())
+    if not isinstance(threshold, dict):
+        threshold = {name: threshold for name in variables}
+    accum = {name: SeriesStatistics(mesh.nC, threshold=threshold.get(name)) for name in variables}
+    for name in variables:
+        accum[name].update(times[0], first[name])
+    del first
+    tasks = [(fname, t, variables, fix_indices, chunksize, None)
+             for t, fname in enumerate(paths) if t > 0]
+    for fname, t, h, x0, snap in _iter_snapshots(tasks, workers, layout=layout):
+        _check_mesh(mesh, h, x0, fname, paths[0])
+        for name in variables:
+            accum[name].update(times[t], snap[name])
+    return mesh, {name: accum[name].result(stats) for name in variables}
@@ -1,20 +1,40 @@
 from __future__ import print_function
 
 __all__ = [
+    'BoxIndex',
+    'MaterialRegistry',
     'MeshSpecifications',
     'RockType',
     'USNT',
+    'EQUATIONS',
+    'register_equation',
 ]
 
 __displayname__ = 'Specifications'
 
 import numpy as np
-import pandas as pd
 import properties
-import copy
 # import warnings
-import time
-import discretize
+
+from . import profiling
+
+
+def _rectilinear_grid(widths, origin=(0., 0., 0.), cell_data=None, filename=None):
+    """Creates a PyVista ``RectilinearGrid`` from the cell widths and origin
+    of a tensor mesh. The Fortran ordered cell arrays in ``cell_data`` match
+    the VTK cell order so they are attached without copying. If given a
+    ``filename``, the grid is also saved (e.g. as a ``.vtr`` file)."""
+    import pyvista
+    nodes = [o + np.concatenate([[0.], np.cumsum(h)]) for o, h in zip(origin, widths)]
+    grid = pyvista.RectilinearGrid(*nodes)
+    for name, values in (cell_data or dict()).items():
+        values = np.asarray(values)
+        if values.dtype == bool:
+            values = values.view(np.uint8)
+        grid.cell_data[name] = values
+    if filename is not None:
+        grid.save(filename)
+    return grid
 
 
 class MaterialComponent(properties.HasProperties):
@@ -34,6 +54,252 @@ class MaterialComponent(properties.HasProperties):
 
 
 
+class MaterialRegistry(object):
+    """A deterministic table of the material components in a ``mat`` dictionary.
+
+    Components are the ``(element prefix, material type)`` pairs and materials
+    are the unique material types. Both are numbered by their first appearance
+    in the deck (never by hashing) so ids are stable across Python processes.
+    Name to id lookups are dictionaries and id to name lookups are lists.
+    """
+
+    def __init__(self, mat):
+        self.components = []
+        self.materials = []
+        self.prefixes = []
+        self._component_ids = dict()
+        self._material_ids = dict()
+        self._prefix_ids = dict()
+        comp_mat, comp_pref = [], []
+        for el_pref in mat.keys():
+            for mat_type in mat[el_pref].keys():
+                self._component_ids[(el_pref, mat_type)] = len(self.components)
+                self.components.append((el_pref, mat_type))
+                comp_mat.append(self._register(mat_type, self.materials, self._material_ids))
+                comp_pref.append(self._register(el_pref, self.prefixes, self._prefix_ids))
+        self.component_material = np.array(comp_mat, dtype=np.int32)
+        self.component_prefix = np.array(comp_pref, dtype=np.int32)
+
+    @staticmethod
+    def _register(name, names, ids):
+        """Gets the id of a name, adding it to the table if it is new"""
+        if name not in ids:
+            ids[name] = len(names)
+            names.append(name)
+        return ids[name]
+
+    @property
+    def n_materials(self):
+        return len(self.materials)
+
+    @property
+    def n_components(self):
+        return len(self.components)
+
+    def material_id(self, mat_type):
+        """Gets the integer id of a material type"""
+        return self._material_ids[mat_type]
+
+    def material_name(self, idx):
+        """Gets the material type of an integer id"""
+        return self.materials[idx]
+
+    def component_id(self, el_pref, mat_type):
+        """Gets the integer id of an element prefix and material type pair"""
+        return self._component_ids[(el_pref, mat_type)]
+
+    def prefix_mask(self, el_pref):
+        """Gets a boolean array of the components with the given prefix"""
+        if el_pref not in self._prefix_ids:
+            return np.zeros(self.n_components, dtype=bool)
+        return self.component_prefix == self._prefix_ids[el_pref]
+
+    def property_matrix(self, rocktab, attributes):
+        """Creates a ``(n_materials, n_attributes)`` float array of the given
+        ``RockType`` attributes for every material from a ``rocktab``."""
+        mat = np.full((self.n_materials, len(attributes)), np.nan)
+        for idx, mat_type in enumerate(self.materials):
+            rt = rocktab[mat_type]
+            for jdx, at in enumerate(attributes):
+                val = rt._get(at)
+                if val is not None:
+                    mat[idx, jdx] = val
+        return mat
+
+    @property
+    def lookup_table(self):
+        """A Pandas ``DataFrame`` of the material types and their ids"""
+        import pandas as pd
+        return pd.DataFrame({'material': self.materials,
+                             'id': np.arange(self.n_materials)})
+
+
+
+class BoxIndex(object):
+    """A spatial index of the material boxes of a mesh for point and region
+    queries without making the full ``nx*ny*nz`` label volume.
+
+    Each axis is split into about ``n_boxes**(1/3)`` buckets along the box
+    edges so the bucket grid is no larger than the number of boxes. Every
+    bucket holds the last box painted over all of it and the boxes painted
+    after that which only cover part of it are kept in a compressed list per
+    bucket. A query takes the last painted box covering each cell so that
+    overlapping boxes resolve as they do when painted. Queries are fully
+    vectorized.
+
+    Args:
+        boxes (np.ndarray): the ``(n_boxes, 6)`` zero based, inclusive
+            ``i0, i1, j0, j1, k0, k1`` box extents in painting order
+        components (np.ndarray): the component id of every box
+        shape (tuple(int)): the number of cells along each axis
+        widths (tuple(np.ndarray)): optional cell widths along each axis for
+            queries with physical coordinates
+        origin (tuple(float)): the coordinates of the mesh corner
+
+    """
+
+    #- The number of cells queried at once
+    CHUNKSIZE = 2**20
+
+    def __init__(self, boxes, components, shape, widths=None, origin=(0., 0., 0.)):
+        self.boxes = np.asarray(boxes, dtype=np.int64).reshape((-1, 6))
+        self.components = np.asarray(components, dtype=np.int32)
+        self.shape = tuple(int(n) for n in shape)
+        n_buckets = max(1, int(round(len(self.boxes) ** (1. / 3.))))
+        self.buckets = []
+        overlap, full = [], []
+        for ax, n in enumerate(self.shape):
+            lo = np.clip(self.boxes[:, 2*ax], 0, n)
+            hi = np.clip(self.boxes[:, 2*ax+1] + 1, 0, n)
+            # Bucket edges on a subset of the box edges
+            edges = np.unique(np.concatenate([[0, n], lo, hi]))
+            if len(edges) - 1 > n_buckets:
+                edges = np.unique(edges[np.linspace(0, len(edges) - 1, n_buckets + 1).round().astype(int)])
+            self.buckets.append(edges)
+            # The buckets touched and the buckets covered by every box
+            overlap.append((np.searchsorted(edges, lo, side='right') - 1, np.searchsorted(edges, hi, side='left')))
+            full.append((np.searchsorted(edges, lo, side='left'), np.searchsorted(edges, hi, side='right') - 1))
+        shape = tuple(len(e) - 1 for e in self.buckets)
+        # The last box covering all of each bucket
+        cover = np.full(shape, -1, dtype=np.int64)
+        pairs = []
+        for idx in range(len(self.boxes)):
+            touched = [(b0[idx], b1[idx]) for b0, b1 in overlap]
+            covered = [(f0[idx], max(f0[idx], f1[idx])) for f0, f1 in full]
+            if any(b1 <= b0 for b0, b1 in touched):
+                continue
+            if all(f1 > f0 for f0, f1 in covered):
+                (x0, x1), (y0, y1), (z0, z1) = covered
+                cover[x0:x1, y0:y1, z0:z1] = idx
+            for part in BoxIndex._shell(touched, covered):
+                pairs.append((np.ravel_multi_index(np.ix_(*part), shape).ravel(), idx))
+        self.cover = cover.ravel()
+        # The boxes painted after the cover of the buckets they partly cover
+        if pairs:
+            bucket = np.concatenate([p[0] for p in pairs])
+            box = np.concatenate([np.full(len(p[0]), p[1], dtype=np.int64) for p in pairs])
+        else:
+            bucket = box = np.empty(0, dtype=np.int64)
+        keep = box > self.cover[bucket]
+        bucket, box = bucket[keep], box[keep]
+        order = np.argsort(bucket, kind='stable')
+        self.pair_boxes = box[order]
+        self.pair_offsets = np.searchsorted(bucket[order], np.arange(self.cover.size + 1))
+        self.edges = None
+        if widths is not None:
+            self.edges = [o + np.concatenate([[0.], np.cumsum(h)]) for o, h in zip(origin, widths)]
+
+    @staticmethod
+    def _shell(touched, covered):
+        """Splits the buckets touched but not covered by a box into blocks of
+        bucket ranges on each axis"""
+        if not all(f1 > f0 for f0, f1 in covered):
+            return [[np.arange(b0, b1) for b0, b1 in touched]]
+        parts = []
+        for ax in range(3):
+            (b0, b1), (f0, f1) = touched[ax], covered[ax]
+            edge = np.r_[np.arange(b0, f0), np.arange(f1, b1)].astype(np.int64)
+            if edge.size:
+                # Covered on the axes before, touched on the axes after
+                part = [np.arange(*covered[a]) for a in range(ax)] + [edge]
+                part += [np.arange(*touched[a]) for a in range(ax + 1, 3)]
+                parts.append(part)
+        return parts
+
+    def _bucket(self, ax, ind):
+        """Gets the bucket of cell indices along an axis"""
+        return np.searchsorted(self.buckets[ax], ind, side='right') - 1
+
+    def _query(self, ijk):
+        """Gets the last painted box (``-1`` if none) of cells in the mesh"""
+        flat = np.ravel_multi_index([self._bucket(ax, ijk[:, ax]) for ax in range(3)],
+                                    [len(e) - 1 for e in self.buckets])
+        best = self.cover[flat].copy()
+        start = self.pair_offsets[flat]
+        counts = self.pair_offsets[flat + 1] - start
+        total = int(counts.sum())
+        if total:
+            # Test every query against the partial boxes of its bucket
+            query = np.repeat(np.arange(len(ijk)), counts)
+            pos = np.repeat(start - np.cumsum(counts) + counts, counts) + np.arange(total)
+            box = self.pair_boxes[pos]
+            ext = self.boxes[box]
+            cell = ijk[query]
+            hit = np.all((cell >= ext[:, 0::2]) & (cell <= ext[:, 1::2]), axis=1)
+            np.maximum.at(best, query[hit], box[hit])
+        return best
+
+    def query_cells(self, ijk):
+        """Gets the component id (``-1`` if none) of an ``(n, 3)`` array of
+        cell indices. Cells outside of the mesh are ``-1``."""
+        ijk = np.asarray(ijk, dtype=np.int64).reshape((-1, 3))
+        inside = np.flatnonzero(np.all((ijk >= 0) & (ijk < self.shape), axis=1))
+        out = np.full(len(ijk), -1, dtype=np.int32)
+        for start in range(0, len(inside), self.CHUNKSIZE):
+            rows = inside[start:start + self.CHUNKSIZE]
+            best = self._query(ijk[rows])
+            out[rows] = np.where(best >= 0, self.components[np.maximum(best, 0)], -1)
+        return out
+
+    def locate(self, points):
+        """Gets the cell indices of an ``(n, 3)`` array of coordinates. Points
+        outside of the mesh are ``-1`` on every axis."""
+        if self.edges is None:
+            raise RuntimeError('This index was made without cell widths.')
+        points = np.asarray(points, dtype=float).reshape((-1, 3))
+        ijk = np.empty(points.shape, dtype=np.int64)
+        for ax, edges in enumerate(self.edges):
+            ijk[:, ax] = np.searchsorted(edges, points[:, ax], side='right') - 1
+            # The far edge belongs to the last cell
+            ijk[points[:, ax] == edges[-1], ax] = len(edges) - 2
+        outside = np.any((ijk < 0) | (ijk >= self.shape), axis=1)
+        ijk[outside] = -1
+        return ijk
+
+    def query_points(self, points):
+        """Gets the component id (``-1`` if none) of an ``(n, 3)`` array of
+        coordinates"""
+        return self.query_cells(self.locate(points))
+
+    def intersecting(self, lower, upper):
+        """Gets the indices of the boxes that intersect the region of cells
+        from ``lower`` to ``upper`` (inclusive ``(i, j, k)`` indices)."""
+        lower = np.asarray(lower).reshape(3)
+        upper = np.asarray(upper).reshape(3)
+        hit = np.ones(len(self.boxes), dtype=bool)
+        for ax in range(3):
+            hit &= (self.boxes[:, 2*ax] <= upper[ax]) & (self.boxes[:, 2*ax+1] >= lower[ax])
+        return np.flatnonzero(hit)
+
+    def region(self, lower, upper):
+        """Gets the component ids of the block of cells from ``lower`` to
+        ``upper`` (inclusive ``(i, j, k)`` indices) as a 3D array."""
+        axes = [np.arange(max(lower[ax], 0), min(upper[ax] + 1, n)) for ax, n in enumerate(self.shape)]
+        ijk = np.stack(np.meshgrid(*axes, indexing='ij'), -1).reshape((-1, 3))
+        return self.query_cells(ijk).reshape([len(a) for a in axes])
+
+
+
 class MeshSpecifications(properties.HasProperties):
     """specifies the mesh geometry, element material types and names as well as
     dual permeability parameters and radiation parameters.
@@ -112,15 +378,17 @@ class MeshSpecifications(properties.HasProperties):
 
     @staticmethod
     def _pasrse_cell_list(line):
-        line_list = []
-        for seg in line:
-            if '*' in seg:
-                sp = seg.split('*')
-                seg_arr = np.ones((int(sp[0]),), dtype=float) * float(sp[1])
-            else:
-                seg_arr = np.array([float(seg)], dtype=float)
-            line_list.append(seg_arr)
-        return np.concatenate(line_list)
+        """Expands a list of widths in the ``n*value`` notation. The counts and
+        values of every segment are parsed in one pass and then expanded with
+        a single ``np.repeat``."""
+        if isinstance(line, str):
+            line = line.split()
+        # Give every plain value a count of one, then parse all the counts
+        # and values as one array of pairs
+        text = ' '.join([seg if '*' in seg else '1*' + seg for seg in line])
+        pairs = np.array(text.replace('*', ' ').split(), dtype=float).reshape((-1, 2))
+        counts, values = pairs[:, 0].astype(np.int64), pairs[:, 1]
+        return np.repeat(values, counts)
 
     @staticmethod
     def __pasrseCellList(line):
@@ -130,92 +398,245 @@ class MeshSpecifications(properties.HasProperties):
     def _create(cls, values, validate=False):
         if not isinstance(values, dict):
             raise RuntimeError('Input values must be a dictionary')
-        start_time = time.time()
-        #print('Creating Mesh Specs...', end='\r')
-        props = cls()
-        mat = values.pop('mat')
-        save = copy.deepcopy(mat)
-        for k, v in values.items():
-            if k in cls._props:
-                # If the value is simple, set it!
-                if isinstance(cls._props[k], properties.String):
-                    p = props._props.get(k)
-                    props._set(k, p.from_json(v))
+        with profiling.phase('create_specs') as ph:
+            props = cls()
+            for k, v in values.items():
+                if k == 'mat':
+                    continue
+                if k in cls._props:
+                    # If the value is simple, set it!
+                    if isinstance(cls._props[k], properties.String):
+                        p = props._props.get(k)
+                        props._set(k, p.from_json(v))
+                    else:
+                        # anything that isnt a mat is a list of floats
+                        # make sure to fix any repetitve values us '*' notations
+                        vals = MeshSpecifications.__pasrseCellList(v)
+                        props._set(k, vals)
                 else:
-                    # anything that isnt a mat is a list of floats
-                    # make sure to fix any repetitve values us '*' notations
-                    vals = MeshSpecifications.__pasrseCellList(v)
-                    props._set(k, vals)
-            else:
-                #warnings.warn("({}:{}) property is not valid.".format(k, v))
-                pass
-        # Now handle the material matrix since all other parameters are set
-        for pref, comp in mat.items():
-            for name, indices in comp.items():
-                for idx, ind in enumerate(indices):
-                    ind = [i.replace('nx', '%d'%(props.nx+1)) for i in ind]
-                    ind = [i.replace('ny', '%d'%(props.ny+1)) for i in ind]
-                    ind = [i.replace('nz', '%d'%(props.nz+1)) for i in ind]
-                    # Now shift the indices by one because someone chose +1 indexing :(
-                    ind = [int(i)-1 for i in ind]
-                    indices[idx] = MaterialComponent(i=ind[0:2],j=ind[2:4],k=ind[4:6])
-                mat[pref][name] = indices
-        props._set('mat', mat)
+                    #warnings.warn("({}:{}) property is not valid.".format(k, v))
+                    pass
+            # Now handle the material matrix since all other parameters are set.
+            # The boxes are kept as compact arrays and ``MaterialComponent``
+            # objects are only made if ``mat`` is accessed.
+            props._set_compact(values.get('mat', {}))
+            ph.count(boxes=len(props._compact[1]))
         # Reutrn the object
-        values['mat'] = save
-        #print('Created Mesh Specs in {} seconds.'.format(time.time() - start_time))
         if validate:
-            start_time = time.time()
-            print('Validating Mesh Specs...', end='\r')
-            props.validate()
-            print('Validated Mesh Specs in {} seconds.'.format(time.time() - start_time))
+            with profiling.phase('validate') as ph:
+                props.validate()
+                ph.note('Validated Mesh Specs')
         return props
 
+    @staticmethod
+    def _parse_boxes(rows, shape):
+        """Converts the six (+1 indexed) index tokens of every material box to
+        a ``(n_boxes, 6)`` array of zero based integers. ``nx``, ``ny`` and
+        ``nz`` are substituted with one dictionary lookup per token and all
+        the tokens are converted to integers at once."""
+        sub = {sym: '%d'%(n+1) for sym, n in zip(['nx', 'ny', 'nz'], shape)}
+        tokens = [sub.get(tok, tok) for ind in rows for tok in ind]
+        if len(tokens) != 6 * len(rows):
+            raise RuntimeError('Material boxes must have six indices: {}'.format(
+                [ind for ind in rows if len(ind) != 6]))
+        # Now shift the indices by one because someone chose +1 indexing :(
+        return (np.array(tokens, dtype=np.int64) - 1).astype(np.int32).reshape((-1, 6))
+
+    def _set_compact(self, mat):
+        """Stores the material boxes of a parsed ``mat`` dictionary as one
+        ``(n_boxes, 6)`` integer array and a component id per box."""
+        registry = MaterialRegistry(mat)
+        boxes, comps = [], []
+        for idx, (el_pref, mat_type) in enumerate(registry.components):
+            indices = mat[el_pref][mat_type]
+            boxes.extend(indices)
+            comps.extend([idx] * len(indices))
+        boxes = MeshSpecifications._parse_boxes(boxes, self.shape)
+        self._backend.pop('mat', None)
+        self._clear_cache(dict(name='mat'))
+        self.__dict__['_compact'] = (registry, boxes, np.array(comps, dtype=np.int32))
+
+    def _build_mat(self):
+        """Makes the ``mat`` dictionary of ``MaterialComponent`` objects from
+        the compact boxes"""
+        registry, boxes, comps = self._compact
+        mat = dict()
+        for box, idx in zip(boxes.tolist(), comps.tolist()):
+            el_pref, mat_type = registry.components[idx]
+            mc = MaterialComponent(i=box[0:2], j=box[2:4], k=box[4:6])
+            mat.setdefault(el_pref, dict()).setdefault(mat_type, []).append(mc)
+        return mat
+
+    def _get(self, name):
+        if name == 'mat' and self.__dict__.get('_compact') is not None and 'mat' not in self._backend:
+            # Build the ``MaterialComponent`` objects on first access. These
+            # can be edited in place so from now on the boxes, labels and
+            # everything else made from ``mat`` are read from it on every use.
+            self._backend['mat'] = self._build_mat()
+            self.__dict__['_compact'] = None
+            self.__dict__['_cache'] = dict()
+        return super(MeshSpecifications, self)._get(name)
+
+    def _with_mat(self, func, *args, **kwargs):
+        """Calls a method that needs ``mat`` without handing the objects out
+        (so the compact boxes are kept)"""
+        if self.__dict__.get('_compact') is None or 'mat' in self._backend:
+            return func(*args, **kwargs)
+        self._backend['mat'] = self._build_mat()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._backend.pop('mat', None)
+
+    def validate(self):
+        return self._with_mat(super(MeshSpecifications, self).validate)
+
+    def serialize(self, *args, **kwargs):
+        return self._with_mat(super(MeshSpecifications, self).serialize, *args, **kwargs)
+
+    @property
+    def boxes(self):
+        """The material boxes as a ``(n_boxes, 6)`` integer array of the zero
+        based ``i0, i1, j0, j1, k0, k1`` cell indices (inclusive) in the order
+        they are painted."""
+        return self._compact_boxes()[0]
+
+    @property
+    def box_components(self):
+        """The index into :attr:`components` of every box in :attr:`boxes`"""
+        return self._compact_boxes()[1]
+
+    def _compact_boxes(self):
+        """Gets the compact boxes, making them from ``mat`` if needed"""
+        compact = self.__dict__.get('_compact')
+        if compact is not None:
+            return compact[1], compact[2]
+        def compute():
+            boxes, comps = [], []
+            for idx, (el_pref, mat_type) in enumerate(self.components):
+                for mc in self.mat[el_pref][mat_type]:
+                    boxes.append([mc.i[0], mc.i[1], mc.j[0], mc.j[1], mc.k[0], mc.k[1]])
+                    comps.append(idx)
+            return (np.array(boxes, dtype=np.int32).reshape((-1, 6)),
+                    np.array(comps, dtype=np.int32))
+        return self._cached('boxes', compute)
+
+    @properties.observer(['mat', 'dx', 'dy', 'dz'])
+    def _clear_cache(self, change):
+        """Invalidates the cached material volumes when the mesh changes"""
+        self.__dict__['_cache'] = dict()
+        if change['name'] == 'mat':
+            self.__dict__['_compact'] = None
+
+    def _cached(self, name, func):
+        """Gets a cached value or computes and caches it with ``func``. Only
+        the values of the compact boxes of a loaded deck are cached: once
+        ``mat`` is handed out (or set) the values are made from it on every
+        call so that its edits show."""
+        if self.__dict__.get('_compact') is None:
+            return func()
+        cache = self.__dict__.setdefault('_cache', dict())
+        if name not in cache:
+            cache[name] = func()
+        return cache[name]
+
+    @property
+    def registry(self):
+        """The :class:`MaterialRegistry` of the ``mat`` components"""
+        compact = self.__dict__.get('_compact')
+        if compact is not None:
+            return compact[0]
+        return self._cached('registry', lambda: MaterialRegistry(self.mat or dict()))
+
+    @property
+    def components(self):
+        """The ``(element prefix, material type)`` pairs of ``mat`` in order.
+        The position in this list is the value in :attr:`labels`."""
+        return self.registry.components
+
+    @property
+    def labels(self):
+        """The index into :attr:`components` of every cell (``-1`` where no
+        material is defined) as a read-only, Fortran ordered integer array.
+        This is painted once and cached for a loaded deck until ``mat`` is
+        accessed or the mesh changes."""
+        def compute():
+            mod = np.full(self.shape, -1, dtype=np.int32, order='F')
+            for (i0, i1, j0, j1, k0, k1), idx in zip(self.boxes.tolist(), self.box_components.tolist()):
+                mod[i0:i1+1,j0:j1+1,k0:k1+1] = idx
+            mod = mod.ravel(order='f')
+            mod.flags.writeable = False
+            return mod
+        return self._cached('labels', compute)
+
+    @property
+    def box_index(self):
+        """A cached :class:`BoxIndex` of the material boxes for point and
+        region queries (with the mesh corner at the origin)."""
+        return self._cached('box_index', lambda: BoxIndex(
+            self.boxes, self.box_components, self.shape, widths=(self.dx, self.dy, self.dz)))
+
+    def query_cells(self, ijk):
+        """Gets the ``(element prefix, material type)`` component id of an
+        ``(n, 3)`` array of cell indices (``-1`` if none). See
+        :attr:`components` and :attr:`registry` to map the ids to names."""
+        return self.box_index.query_cells(ijk)
+
+    def query_points(self, points):
+        """Gets the component id of an ``(n, 3)`` array of coordinates"""
+        return self.box_index.query_points(points)
+
+    def _gather(self, values, fill):
+        """Gathers a value per component onto every cell of the mesh. Cells
+        without a material get the ``fill`` value."""
+        values = np.append(np.asarray(values), fill)
+        return values[self.labels]
+
     @property
     def definitions(self):
         """Gets the ``mat_type`` definitions as integers to be matched with any
-        given rocktab file via the lookup table."""
-        mod = np.empty(self.shape, dtype=int)
-        lootbl = self.lookup_table.set_index('material')
-        for el_pref in self.mat.keys():
-            for mat_type in self.mat[el_pref].keys():
-                for mc in self.mat[el_pref][mat_type]:
-                    mod[mc.i[0]:mc.i[1]+1,mc.j[0]:mc.j[1]+1,mc.k[0]:mc.k[1]+1] = lootbl.loc[mat_type]['id']
-        return mod.flatten(order='f')
+        given rocktab file via the lookup table (``-1`` where undefined)."""
+        return self._gather(self.registry.component_material, -1)
 
     @property
     def injector(self):
-        mod = np.full(self.shape, False, dtype=bool)
-        for mat_type in self.mat['wb1'].keys():
-            for mc in self.mat['wb1'][mat_type]:
-                mod[mc.i[0]:mc.i[1]+1,mc.j[0]:mc.j[1]+1,mc.k[0]:mc.k[1]+1] = True
-        return mod.flatten(order='f')
+        return self._gather(self.registry.prefix_mask('wb1'), False)
 
     @property
     def materials(self):
-        mats = []
-        for el_pref in self.mat.keys():
-            for mat_type in self.mat[el_pref].keys():
-                mats.append(mat_type)
-        return list(set(mats))
+        """The unique material types in order of first appearance"""
+        return list(self.registry.materials)
 
     @property
     def lookup_table(self):
-        mats = self.materials
-        df = pd.DataFrame(data=mats, columns=['material'])
-        df['id'] = pd.factorize(df['material'])[0]
-        return df
+        return self.registry.lookup_table
 
     def to_tensor_mesh(self):
+        import discretize
         return discretize.TensorMesh(h=[self.dx, self.dy, self.dz])
 
     def toTensorMesh(self):
         return self.to_tensor_mesh()
 
-    def to_rectilinear_grid(self):
-        """Create a PyVista ``RectilinearGrid``."""
-        import pyvista
-        return pyvista.RectilinearGrid(self.dx, self.dy, self.dz)
+    def cell_data(self):
+        """Gets a dictionary of the cell arrays of the mesh: the material
+        ``definitions`` and the ``injector`` cells."""
+        return {'definitions': self.definitions, 'injector': self.injector}
+
+    def to_rectilinear_grid(self, origin=(0., 0., 0.), data=True, filename=None):
+        """Create a PyVista ``RectilinearGrid`` with its nodes at the
+        cumulative cell widths from the ``origin``.
+
+        Args:
+            origin (tuple(float)): the coordinates of the mesh corner
+            data (bool): If True, attach the arrays of :meth:`cell_data`
+            filename (str): If given, also save the grid to this file
+                (e.g. ``model.vtr``)
+
+        """
+        cell_data = self.cell_data() if data else None
+        return _rectilinear_grid((self.dx, self.dy, self.dz), origin=origin,
+                                 cell_data=cell_data, filename=filename)
 
 
 
@@ -230,6 +651,38 @@ class EqnParams(properties.HasProperties):
     params = properties.List('The parameters', Param)
 
 
+class ParamRecord(object):
+    """A lightweight, slotted record of a :class:`Param` used when loading"""
+    __slots__ = ('name', 'value')
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def __repr__(self):
+        return 'ParamRecord({!r}, {!r})'.format(self.name, self.value)
+
+    def to_param(self):
+        return Param(name=self.name, value=self.value)
+
+
+class EqnRecord(object):
+    """A lightweight, slotted record of an :class:`EqnParams` used when loading"""
+    __slots__ = ('phase', 'equation', 'params')
+
+    def __init__(self, phase, equation, params):
+        self.phase = phase
+        self.equation = equation
+        self.params = params
+
+    def __repr__(self):
+        return 'EqnRecord({!r}, {!r}, {!r})'.format(self.phase, self.equation, self.params)
+
+    def to_eqn_params(self):
+        return EqnParams(phase=self.phase, equation=self.equation,
+                         params=[p.to_param() for p in self.params])
+
+
 class RockType(properties.HasProperties):
     mat_type = properties.String('The rock type name corresponding to ``MaterialComponent.mat_type``.')
 
@@ -251,10 +704,16 @@ class RockType(properties.HasProperties):
 
     @classmethod
     def _create(cls, mat_type, values, validate=True):
+        """Creates a rock type from a parsed ``rocktab`` entry. The parameter
+        lists are held as slotted records and the ``Param``/``EqnParams``
+        objects are only made when those properties are accessed. With
+        ``validate`` the simple properties are checked and the records are
+        checked for completeness without making those objects."""
         if not isinstance(values, dict):
             raise RuntimeError('Input values must be a dictionary')
         props = cls()
         props.mat_type = mat_type
+        records = dict()
         for k, v in values.items():
             if k in cls._props:
                 # If the value is simple, set it!
@@ -263,22 +722,140 @@ class RockType(properties.HasProperties):
                     props._set(k, p.from_json(v))
                 elif k in ['Kd', 'KdFactor']:
                     # v is a dictionary of name value pairs of params
-                    props._set(k, [Param(name=n, value=float(p)) for n,p in v.items()])
+                    records[k] = [ParamRecord(n, float(p)) for n,p in v.items()]
                 elif k in ['tort', 'pc', 'kr']:
                     phases = []
                     for phase, eqns in v.items():
-                        opt = eqns.pop('option')
-                        params = [Param(name=n, value=float(p)) for n,p in eqns.items()]
-                        phases.append(EqnParams(phase=phase, equation=opt, params=params))
-                    props._set(k, phases)
+                        params = [ParamRecord(n, float(p)) for n,p in eqns.items() if n != 'option']
+                        phases.append(EqnRecord(phase, eqns.get('option'), params))
+                    records[k] = phases
                 else:
                     #warnings.warn("({}:{}) property is not valid.".format(k, v))
                     pass
             else:
                 print('WARN: {} not a property of this class.'.format(k))
-        if validate: props.validate()
+        props.__dict__['_records'] = records
+        if validate:
+            with profiling.phase('validate', rock_types=1):
+                props._validate_fast()
         return props
 
+    def _validate_fast(self):
+        """Checks every property without making the records into objects"""
+        records = self.__dict__.get('_records', {})
+        for key, prop in self._props.items():
+            if key in records:
+                if any(r.equation is None for r in records[key] if isinstance(r, EqnRecord)):
+                    raise properties.ValidationError('The {} equations of {} must all name an equation.'.format(key, self.mat_type))
+                continue
+            prop.assert_valid(self)
+        return True
+
+    def records(self, name):
+        """Gets the ``Kd``, ``KdFactor``, ``tort``, ``pc`` or ``kr`` entries as
+        lightweight :class:`ParamRecord`/:class:`EqnRecord` lists"""
+        records = self.__dict__.get('_records', {})
+        if name in records:
+            return records[name]
+        value = self._get(name) or []
+        if name in ['Kd', 'KdFactor']:
+            return [ParamRecord(p.name, p.value) for p in value]
+        return [EqnRecord(e.phase, e.equation, [ParamRecord(p.name, p.value) for p in e.params])
+                for e in value]
+
+    def _get(self, name):
+        records = self.__dict__.get('_records')
+        if records and name in records:
+            # Build the ``HasProperties`` objects on first access
+            recs = records.pop(name)
+            if name in ['Kd', 'KdFactor']:
+                self._backend[name] = [r.to_param() for r in recs]
+            else:
+                self._backend[name] = [r.to_eqn_params() for r in recs]
+        return super(RockType, self)._get(name)
+
+    def validate(self):
+        for name in list(self.__dict__.get('_records', {}).keys()):
+            self._get(name)
+        return super(RockType, self).validate()
+
+    def serialize(self, *args, **kwargs):
+        for name in list(self.__dict__.get('_records', {}).keys()):
+            self._get(name)
+        return super(RockType, self).serialize(*args, **kwargs)
+
+    @properties.observer(['Kd', 'KdFactor', 'tort', 'pc', 'kr'])
+    def _clear_records(self, change):
+        """Drops the loaded records of a property that has been set"""
+        self.__dict__.get('_records', {}).pop(change['name'], None)
+
+
+def _effective_saturation(saturation, params):
+    """Scales the liquid saturation between the residual liquid (``Slr``) and
+    gas (``Sgr``) saturations and clips it to ``[0, 1]``"""
+    slr = np.nan_to_num(params.get('Slr', 0.))
+    sgr = np.nan_to_num(params.get('Sgr', 0.))
+    return np.clip((saturation - slr) / (1. - slr - sgr), 0., 1.)
+
+
+def _kr_van_genuchten(saturation, phase, params):
+    """The van Genuchten-Mualem relative permeability of the liquid phase and
+    its complement for the gas phase"""
+    se = _effective_saturation(saturation, params)
+    m = params['m']
+    if phase == 'gas':
+        return np.sqrt(1. - se) * (1. - se**(1. / m))**(2. * m)
+    return np.sqrt(se) * (1. - (1. - se**(1. / m))**m)**2
+
+
+def _pc_van_genuchten(saturation, phase, params):
+    """The van Genuchten capillary pressure (infinite at the residual
+    saturation)"""
+    se = _effective_saturation(saturation, params)
+    m = params['m']
+    with np.errstate(divide='ignore'):
+        return (se**(-1. / m) - 1.)**(1. - m) / params['alpha']
+
+
+def _constant(saturation, phase, params):
+    """A constant ``value`` on every cell"""
+    return params['value'] * np.ones_like(saturation)
+
+
+#- The functions of the supported equations of each kind of ``RockType``
+#- equation. Every function is given the liquid saturation of the cells, the
+#- phase and a dictionary of the parameters of each cell.
+EQUATIONS = {
+    'kr': {
+        'vanGenuchten': _kr_van_genuchten,
+        'constant': _constant,
+    },
+    'pc': {
+        'vanGenuchten': _pc_van_genuchten,
+        'constant': _constant,
+    },
+    'tort': {
+        'constant': _constant,
+    },
+}
+
+
+def register_equation(kind, equation, func):
+    """Adds (or replaces) the function of an equation evaluated by
+    :meth:`USNT.evaluate`.
+
+    Args:
+        kind (str): the ``RockType`` equations: ``kr``, ``pc`` or ``tort``
+        equation (str): the equation name used in the rocktab
+        func (callable): called as ``func(saturation, phase, params)`` with
+            the liquid saturation array, the phase name and a dictionary of
+            the parameter arrays of the cells. Returns the value of every cell.
+
+    """
+    if kind not in EQUATIONS:
+        raise RuntimeError('Unknown equation kind ({}). Use one of {}.'.format(kind, sorted(EQUATIONS)))
+    EQUATIONS[kind][equation] = func
+
 
 class USNT(MeshSpecifications):
     """The base object to instantiate."""
@@ -292,21 +869,110 @@ class USNT(MeshSpecifications):
                 atts.append(k)
         return atts
 
+    @property
+    def property_matrix(self):
+        """A ``(n_materials, n_attributes)`` array of every float attribute in
+        :attr:`attributes` for each material in the registry. This is read
+        from the rocktab on every access so edits of the rock types show."""
+        return self.registry.property_matrix(self.rocktab, self.attributes)
+
     def model(self, attribute):
         """Gets a rocktab attribute as a NumPy array ready for discretize or PVGeo"""
-        mod = np.empty(self.shape)
-        mod[:] = np.nan
-        for el_pref in self.mat.keys():
-            for mat_type in self.mat[el_pref].keys():
-                for mc in self.mat[el_pref][mat_type]:
-                    mod[mc.i[0]:mc.i[1]+1,mc.j[0]:mc.j[1]+1,mc.k[0]:mc.k[1]+1] = self.rocktab[mat_type]._get(attribute)
-        return mod.flatten(order='f')
+        values = self.registry.property_matrix(self.rocktab, [attribute])[:, 0]
+        return self._gather(values[self.registry.component_material], np.nan)
+
+    def equation_params(self, kind, phase):
+        """Gets the equation of every material for a phase of the ``kr``,
+        ``pc`` or ``tort`` entries of the rocktab.
+
+        Return:
+            dict: the ``(material ids, {parameter: values})`` of every
+            equation name where the values are ``(n_materials + 1,)`` arrays
+            that are NaN for the other materials (and last for the undefined
+            cells).
+
+        """
+        groups = dict()
+        for idx, mat_type in enumerate(self.registry.materials):
+            if mat_type not in self.rocktab:
+                continue
+            for rec in self.rocktab[mat_type].records(kind):
+                if rec.phase != phase:
+                    continue
+                ids, params = groups.setdefault(rec.equation, ([], dict()))
+                ids.append(idx)
+                for p in rec.params:
+                    if p.name not in params:
+                        params[p.name] = np.full(self.registry.n_materials + 1, np.nan)
+                    params[p.name][idx] = p.value
+        return {eqn: (np.array(ids), params) for eqn, (ids, params) in groups.items()}
+
+    def evaluate(self, kind, phase, saturation=None):
+        """Evaluates a ``kr``, ``pc`` or ``tort`` equation of the rocktab on
+        every cell of the mesh. The parameters of each material are gathered
+        onto the cells through the material labels and the equation is one
+        NumPy expression over the cells of all the materials that use it. See
+        :data:`EQUATIONS` and :func:`register_equation` for the supported
+        equations.
+
+        Args:
+            kind (str): ``kr``, ``pc`` or ``tort``
+            phase (str): the phase of the equation (e.g. ``liquid``)
+            saturation (float or np.ndarray): the liquid saturation of every
+                cell in the (Fortran) cell order of the mesh (e.g. the ``Sl``
+                model from :meth:`nuftio.NuftMesh.read_nuft`)
+
+        Return:
+            np.ndarray: the value of every cell (NaN where the material has no
+            equation for the phase)
+
+        """
+        if kind not in EQUATIONS:
+            raise RuntimeError('Unknown equation kind ({}). Use one of {}.'.format(kind, sorted(EQUATIONS)))
+        n_cells = int(np.prod(self.shape))
+        if saturation is None:
+            if kind != 'tort':
+                raise RuntimeError('A ``saturation`` is needed to evaluate ({}).'.format(kind))
+            saturation = np.nan
+        saturation = np.asarray(saturation, dtype=float)
+        if saturation.size == 1:
+            saturation = np.full(n_cells, saturation.ravel()[0])
+        elif saturation.size != n_cells:
+            raise RuntimeError('The saturation has {} values but the mesh has {} cells.'.format(
+                saturation.size, n_cells))
+        saturation = saturation.ravel(order='F')
+        groups = self.equation_params(kind, phase)
+        missing = [eqn for eqn in groups if eqn not in EQUATIONS[kind]]
+        if missing:
+            raise RuntimeError('Unsupported ({}) equations: {}. Add them with ``register_equation``.'.format(
+                kind, missing))
+        # The material id of every cell (the last parameter value when undefined)
+        cell_mat = self.definitions
+        out = np.full(n_cells, np.nan)
+        for eqn, (ids, params) in groups.items():
+            if len(ids) == self.registry.n_materials:
+                cells = slice(None)
+                mats = cell_mat
+            else:
+                cells = np.flatnonzero(np.isin(cell_mat, ids))
+                mats = cell_mat[cells]
+            values = {name: vals[mats] for name, vals in params.items()}
+            with np.errstate(invalid='ignore'):
+                out[cells] = EQUATIONS[kind][eqn](saturation[cells], phase, values)
+        return out
+
+    def cell_data(self):
+        """Gets a dictionary of the cell arrays of the mesh: the material
+        ``definitions``, the ``injector`` cells and every rocktab attribute."""
+        data = super(USNT, self).cell_data()
+        for key in self.attributes:
+            data[key] = self.model(key)
+        return data
 
     def all_models(self, dataframe=True):
         """Returns all attributes in a Pandas DataFrame"""
-        df = pd.DataFrame()
-        for key in self.attributes:
-            df[key] = self.model(key)
+        import pandas as pd
+        df = pd.DataFrame({key: self.model(key) for key in self.attributes})
         if dataframe:
             return df
         return df.to_dict()
@@ -316,12 +982,11 @@ class USNT(MeshSpecifications):
 
     def save_lith_lookup_table(self, filename):
         atts = ['K0', 'K1', 'K2', 'porosity', 'solid_density']
-        lootbl = self.lookup_table.set_index('material')
-        for at in atts:
-            lootbl[at] = np.full(len(lootbl), np.nan)
-            for k in lootbl.index:
-                lootbl.loc[k,at] = self.rocktab[k]._get(at)
-        lootbl = lootbl.reset_index()
+        lootbl = self.lookup_table
+        all_atts = self.attributes
+        props = self.property_matrix[:, [all_atts.index(at) for at in atts]]
+        for jdx, at in enumerate(atts):
+            lootbl[at] = props[:, jdx]
         lootbl = lootbl.set_index('id')
         return lootbl.to_csv(filename, index_label='Index')
 
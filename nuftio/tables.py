@@ -0,0 +1,258 @@
+"""A pandas-free reader of the whitespace delimited numeric tables written by
+NUFT (e.g. the results tables read by :meth:`~nuftio.results.NuftMesh.read_nuft`).
+
+The file is memory mapped and split into line aligned byte ranges that are
+parsed in a thread pool. NumPy's text parser releases the GIL, so the ranges
+are parsed in parallel, and every range is copied straight into preallocated
+column arrays.
+"""
+from __future__ import print_function
+
+__displayname__ = 'Tables'
+
+__all__ = [
+    'read_columns',
+    'iter_columns',
+]
+
+import collections
+import concurrent.futures
+import contextlib
+import mmap
+import os
+
+import numpy as np
+
+
+#- The default size of the byte ranges parsed by each thread
+RANGE_BYTES = 8 * 1024**2
+
+
+def _tokens(raw):
+    """Gets the start and end offsets of the whitespace separated tokens of a
+    byte array without splitting it"""
+    space = (raw == 32) | ((raw >= 9) & (raw <= 13))
+    starts = np.flatnonzero(~space & np.r_[True, space[:-1]])
+    ends = np.flatnonzero(space & np.r_[False, ~space[:-1]])
+    return starts, np.r_[ends, raw.size][:starts.size]
+
+
+def _gather(raw, starts, ends):
+    """Copies the tokens between ``starts`` and ``ends`` to a new byte string
+    keeping the separator after each"""
+    mark = np.zeros(raw.size + 2, dtype=np.int8)
+    mark[starts] += 1
+    mark[ends + 1] -= 1
+    return raw[np.cumsum(mark[:raw.size], dtype=np.int8) > 0].tobytes()
+
+
+def _check_rows(raw, starts, ncols, where=''):
+    """Raises an error if a non-blank line does not hold ``ncols`` tokens"""
+    per_line = np.bincount(np.searchsorted(np.flatnonzero(raw == 10), starts))
+    bad = np.flatnonzero((per_line > 0) & (per_line != ncols))
+    if bad.size:
+        raise RuntimeError('Malformed rows found{}: line {} of the block has {} values but there are {} columns.'.format(
+            where, int(bad[0]) + 1, int(per_line[bad[0]]), ncols))
+
+
+def _parse_values(text, ncols, where='', lines=True, cols=None):
+    """Parses a block of whitespace delimited numbers to a ``(rows, ncols)``
+    float array. Blank lines are skipped and every other line must hold
+    ``ncols`` numbers or an error is raised. Without ``lines`` the rows may
+    wrap over lines and only the number of values is checked.
+
+    Given the indices of ``cols`` only the tokens of those columns are parsed
+    to a ``(rows, len(cols))`` array. The tokens of the other columns are
+    counted but never converted to numbers."""
+    if isinstance(text, str):
+        text = text.encode('utf-8')
+    raw = np.frombuffer(text, dtype=np.uint8)
+    starts, ends = _tokens(raw)
+    if ncols < 1 or starts.size % ncols != 0:
+        raise RuntimeError('Malformed rows found{}: {} values do not fill {} columns.'.format(
+            where, starts.size, ncols))
+    if cols is None:
+        cols = np.arange(ncols)
+    cols = np.asarray(cols, dtype=np.int64)
+    if starts.size < 1:
+        # Blank text (``np.fromstring`` would give a -1)
+        return np.empty((0, cols.size))
+    if lines:
+        _check_rows(raw, starts, ncols, where=where)
+    used, order = np.unique(cols, return_inverse=True)
+    if used.size < ncols:
+        # Copy out the tokens of the used columns only
+        pick = np.isin(np.arange(starts.size) % ncols, used)
+        text = _gather(raw, starts[pick], ends[pick])
+    count = starts.size // ncols * used.size
+    try:
+        values = np.fromstring(text, sep=' ')
+    except (ValueError, DeprecationWarning):
+        # Non-numeric values with warnings raised as errors
+        values = np.empty(0)
+    if values.size != count:
+        raise RuntimeError('Non-numeric values found{}: only the first {} of {} values are numbers.'.format(
+            where, values.size, count))
+    return values.reshape((-1, used.size))[:, order]
+
+
+def _open(filename):
+    """Memory maps a file and reads its header. Returns the map (``None`` for
+    an empty body), the column names and the offset of the first data row."""
+    with open(filename, 'rb') as f:
+        header = f.readline()
+        size = os.fstat(f.fileno()).st_size
+        if size <= len(header):
+            return None, header.decode('utf-8').split(), len(header)
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mm, header.decode('utf-8').split(), len(header)
+
+
+def _line_ranges(buf, start, range_bytes):
+    """Splits ``buf[start:]`` into ``(begin, end)`` byte ranges that end on
+    a line break"""
+    ranges = []
+    size = len(buf)
+    while start < size:
+        end = buf.find(b'\n', min(start + range_bytes, size - 1))
+        end = size if end < 0 else end + 1
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _range_bytes(range_bytes, size, threads):
+    """Gets a range size that gives every thread a few ranges"""
+    if range_bytes is not None:
+        return max(int(range_bytes), 1)
+    return int(min(RANGE_BYTES, max(size // (4 * threads), 64 * 1024)))
+
+
+def _columns(header, names, usecols):
+    """Gets the names of all the columns and the indices of those to read"""
+    if names is None:
+        names = header
+    names = list(names)
+    if usecols is None:
+        usecols = names
+    missing = [c for c in usecols if c not in names]
+    if missing:
+        raise RuntimeError('Columns ({}) not found in the table.'.format(missing))
+    return names, [names.index(c) for c in usecols], list(usecols)
+
+
+def _count_rows(buf, begin, end):
+    """Counts the lines of a byte range on a view of the map without
+    copying it"""
+    view = np.frombuffer(buf, dtype=np.uint8, offset=begin, count=end - begin)
+    return int(np.count_nonzero(view == 10)) + int(view[-1] != 10)
+
+
+def _read_range(buf, begin, end, ncols, cols=None):
+    """Parses the ``cols`` of one byte range to a ``(rows, len(cols))``
+    array"""
+    return _parse_values(buf[begin:end], ncols, where=' in bytes {} to {}'.format(begin, end), cols=cols)
+
+
+def read_columns(filename, usecols=None, names=None, threads=None, dtypes=None, range_bytes=None):
+    """Reads a whitespace delimited numeric table with a header line into a
+    dictionary of NumPy arrays without pandas.
+
+    The file is memory mapped and split into line aligned byte ranges. The
+    rows of every range are counted in a thread pool first so the columns are
+    preallocated and every range is then parsed in the pool and copied into
+    its slice of the columns. Only the tokens of ``usecols`` are converted to
+    numbers.
+
+    Args:
+        filename (str): the file name
+        usecols (list(str)): the columns to return (defaults to all)
+        names (list(str)): the column names (defaults to the header line)
+        threads (int): the number of threads (defaults to the number of CPUs)
+        dtypes (dict): the data type of any of the columns (e.g. ``int`` for
+            index columns). The others are ``float64``.
+        range_bytes (int): the size of the byte ranges parsed by each thread
+
+    Return:
+        collections.OrderedDict: the array of every column in ``usecols``
+
+    """
+    threads = threads or os.cpu_count() or 1
+    dtypes = dtypes or dict()
+    mm, header, start = _open(filename)
+    names, indices, usecols = _columns(header, names, usecols)
+    if mm is None:
+        return collections.OrderedDict((c, np.empty(0, dtype=dtypes.get(c, float))) for c in usecols)
+    with contextlib.closing(mm):
+        ranges = _line_ranges(mm, start, _range_bytes(range_bytes, len(mm) - start, threads))
+        out = collections.OrderedDict()
+        filled = [0] * len(ranges)
+
+        def parse(idx):
+            arr = _read_range(mm, ranges[idx][0], ranges[idx][1], len(names), cols=indices)
+            o = offsets[idx]
+            for col, c in enumerate(usecols):
+                out[c][o:o + len(arr)] = arr[:, col]
+            filled[idx] = len(arr)
+
+        pool = None
+        if threads > 1 and len(ranges) > 1:
+            pool = concurrent.futures.ThreadPoolExecutor(max_workers=threads)
+        run = pool.map if pool is not None else map
+        try:
+            # Count the lines of every range to place the rows
+            counts = list(run(lambda rng: _count_rows(mm, *rng), ranges))
+            offsets = np.r_[0, np.cumsum(counts)].astype(np.int64)
+            for c in usecols:
+                out[c] = np.empty(offsets[-1], dtype=dtypes.get(c, float))
+            list(run(parse, range(len(ranges))))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+    if filled != counts:
+        # Blank lines: move the rows of every range together
+        keep = np.concatenate([np.arange(o, o + n) for o, n in zip(offsets[:-1], filled)])
+        out = collections.OrderedDict((c, col[keep]) for c, col in out.items())
+    return out
+
+
+def iter_columns(filename, usecols=None, names=None, threads=None, dtypes=None, range_bytes=None):
+    """Iterates over a whitespace delimited numeric table one byte range at a
+    time yielding a dictionary of the column arrays of each range in file
+    order. The ranges are parsed ahead in a thread pool. The arguments are the
+    same as :func:`read_columns`."""
+    threads = threads or os.cpu_count() or 1
+    dtypes = dtypes or dict()
+    mm, header, start = _open(filename)
+    names, indices, usecols = _columns(header, names, usecols)
+    if mm is None:
+        return
+
+    def parse(rng):
+        arr = _read_range(mm, rng[0], rng[1], len(names), cols=indices)
+        return len(arr), collections.OrderedDict((c, arr[:, col].astype(dtypes.get(c, float)))
+                                                 for col, c in enumerate(usecols))
+
+    with contextlib.closing(mm):
+        ranges = _line_ranges(mm, start, _range_bytes(range_bytes, len(mm) - start, threads))
+        if threads == 1 or len(ranges) < 2:
+            chunks = (parse(rng) for rng in ranges)
+        else:
+            chunks = _iter_ahead(parse, ranges, threads)
+        for rows, chunk in chunks:
+            # Skip the ranges of blank lines
+            if rows:
+                yield chunk
+
+
+def _iter_ahead(func, items, threads):
+    """Maps ``func`` over ``items`` in a thread pool yielding the results in
+    order with at most ``2 * threads`` in flight"""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = collections.deque()
+        for item in items:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= 2 * threads:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -17,15 +17,18 @@ setuptools.setup(
     long_description=long_description,
     long_description_content_type="text/x-rst",
     url="https://github.com/banesullivan/nuftio",
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=['benchmarks', 'benchmarks.*']),
     install_requires=[
-        'cPyparsing==2.2.0.1.1.1',
         'numpy',
         'pandas',
         'xmltodict',
         'properties',
         'discretize',
     ],
+    extras_require={
+        'pyparsing': ['cPyparsing'],
+        'vtk': ['pyvista'],
+    },
     classifiers=(
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
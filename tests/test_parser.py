@@ -0,0 +1,96 @@
+"""Parsing the NUFT S-expression format."""
+import io
+
+import pytest
+
+import nuftio
+from nuftio import Parser
+
+
+DECK = """; a small input deck
+(genmsh
+  (coord rect)   ; rectangular
+  (down 0 0 1)
+  (dx 3*1.5 2.0)
+  (dy 4*2) (dz 1 2 3)
+  (mat
+    (rock sand 1 nx 1 ny 1 nz)
+    (rock clay 2 4 1 2 2 3)
+  )
+)
+(rocktab
+  (sand (porosity 0.3) (kr (liquid vanGenuchten (m 0.45) (Slr 0.1))))
+  (clay (porosity 0.1))
+)
+"""
+
+QUOTED = [
+    '(a (b "x y"))',
+    '(a (b "x (y"))',
+    "(a (name 'p) q' 2))",
+    '(a (b c"d e"))',
+    '(a (t "x\\"y z") (u 1 2))',
+    '(a (b "") (c 3))',
+]
+
+
+def _has_pyparsing():
+    for name in ['cPyparsing', 'pyparsing']:
+        try:
+            __import__(name)
+            return True
+        except ImportError:
+            pass
+    return False
+
+
+needs_pyparsing = pytest.mark.skipif(not _has_pyparsing(), reason='pyparsing is not installed')
+
+
+@needs_pyparsing
+@pytest.mark.parametrize('text', [DECK.split('(rocktab')[0]] + QUOTED)
+def test_engines_agree(text):
+    text = Parser._readFileContents(io.StringIO(text))
+    assert Parser.parse_string(text, engine='fast') == Parser.parse_string(text, engine='pyparsing')
+
+
+def test_quoted_strings():
+    assert Parser.parse_string('(a (b "x (y") (c 1))') == {'a': {'b': '"x (y"', 'c': '1'}}
+    index = Parser.index_file(io.BytesIO(b'(genmsh (title "my (deck)") (dx 1 2))\n(rocktab (m (porosity 0.1)))'))
+    assert list(index) == ['genmsh', 'rocktab']
+    assert index['genmsh'] == {'title': '"my (deck)"', 'dx': ['1', '2']}
+
+
+@pytest.mark.parametrize('chunksize', [1, 7, 64, 1024 * 1024])
+@pytest.mark.parametrize('memory_map', [False, True])
+def test_parse_file_chunks(tmp_path, chunksize, memory_map):
+    path = tmp_path / 'deck.in'
+    path.write_text(DECK)
+    # Like the ``pyparsing`` grammar, only the first data block is returned
+    expected = Parser.parse_file(io.StringIO(DECK), chunksize=1024 * 1024)
+    assert list(expected) == ['genmsh']
+    assert expected['genmsh']['dx'] == ['3*1.5', '2.0']
+    assert Parser.parse_file(str(path), chunksize=chunksize, memory_map=memory_map, cache=False) == expected
+    assert Parser.parse_file(io.BytesIO(DECK.encode()), chunksize=chunksize) == expected
+
+
+def test_section_index(tmp_path):
+    path = tmp_path / 'deck.in'
+    path.write_text(DECK)
+    index = Parser.index_file(str(path))
+    # Membership and iteration do not parse any block
+    assert 'genmsh' in index and 'rocktab' in index and 'other' not in index
+    assert sorted(index) == ['genmsh', 'rocktab']
+    assert index._cache == dict()
+    rocktab = Parser.parse_string(DECK[DECK.index('(rocktab'):])
+    assert index['rocktab'] == rocktab['rocktab']
+    assert list(index._cache) == ['rocktab']
+
+
+def test_malformed_block_error(tmp_path):
+    # The error of a malformed block is not hidden behind a missing key
+    path = tmp_path / 'bad.in'
+    path.write_text('(genmsh (dx 1 2) (mat (rock) ))')
+    with pytest.raises(Exception) as err:
+        nuftio.read_genmsh(str(path), cache=False)
+    assert 'is not (genmsh)' not in str(err.value)
@@ -0,0 +1,131 @@
+"""Reading NUFT results tables with :meth:`nuftio.NuftMesh.read_nuft`."""
+import io
+
+import numpy as np
+import pytest
+
+from nuftio import NuftMesh, NuftLayout
+
+
+SHAPE = (6, 4, 5)
+
+
+@pytest.fixture
+def results():
+    rng = np.random.RandomState(0)
+    mesh = NuftMesh([rng.uniform(1., 2., n) for n in SHAPE], x0=(10., -5., 100.))
+    models = {'Sl': rng.rand(mesh.nC), 'P': rng.rand(mesh.nC) * 1e5}
+    return mesh, models
+
+
+def _write(filename, mesh, models, order=None):
+    """Writes the results table with ``write_nuft`` and rewrites its rows in
+    the given order (which may leave rows out)"""
+    buf = io.StringIO()
+    mesh.write_nuft(buf, models)
+    lines = buf.getvalue().splitlines()
+    rows = lines[1:] if order is None else [lines[1:][i] for i in order]
+    with open(filename, 'w') as f:
+        f.write('\n'.join([lines[0]] + rows) + '\n')
+    return filename
+
+
+def _assert_mesh(read, mesh):
+    assert list(read.vnC) == list(mesh.vnC)
+    for h, hr in zip(mesh.h, read.h):
+        np.testing.assert_allclose(hr, h)
+    np.testing.assert_allclose(read.x0, mesh.x0)
+
+
+def _assert_models(read, expected):
+    assert sorted(read) == sorted(expected)
+    for name, mod in expected.items():
+        # The default pandas float parser is not correctly rounded
+        np.testing.assert_allclose(read[name], mod, rtol=1e-14, atol=1e-15)
+
+
+def _sub(mesh, models, window):
+    """Cuts a window of cells out of the expected models"""
+    ranges = tuple(slice(lo, hi + 1) for lo, hi in window)
+    return {name: mod.reshape(mesh.vnC, order='F')[ranges].ravel(order='F')
+            for name, mod in models.items()}
+
+
+@pytest.mark.parametrize('threads', [None, 2])
+@pytest.mark.parametrize('chunksize', [None, 7])
+def test_shuffled_rows(tmp_path, results, threads, chunksize):
+    mesh, models = results
+    order = np.random.RandomState(1).permutation(mesh.nC)
+    filename = _write(str(tmp_path / 'shuffled.txt'), mesh, models, order=order)
+    read, read_models = NuftMesh.read_nuft(filename, chunksize=chunksize, threads=threads)
+    _assert_mesh(read, mesh)
+    _assert_models(read_models, models)
+
+
+@pytest.mark.parametrize('threads', [None, 2])
+@pytest.mark.parametrize('chunksize', [None, 7])
+def test_missing_cells(tmp_path, results, threads, chunksize):
+    mesh, models = results
+    missing = np.array([3, 17, 18, 40, mesh.nC - 2])
+    order = np.random.RandomState(2).permutation(np.setdiff1d(np.arange(mesh.nC), missing))
+    filename = _write(str(tmp_path / 'partial.txt'), mesh, models, order=order)
+    read, read_models = NuftMesh.read_nuft(filename, chunksize=chunksize, threads=threads)
+    _assert_mesh(read, mesh)
+    for name, mod in models.items():
+        assert np.isnan(read_models[name][missing]).all()
+        expected = mod.copy()
+        expected[missing] = np.nan
+        np.testing.assert_allclose(read_models[name], expected, rtol=1e-14, atol=1e-15)
+
+
+@pytest.mark.parametrize('chunksize', [None, 7])
+def test_window(tmp_path, results, chunksize):
+    mesh, models = results
+    order = np.random.RandomState(3).permutation(mesh.nC)
+    filename = _write(str(tmp_path / 'shuffled.txt'), mesh, models, order=order)
+    window = ((1, 3), (0, 2), (2, 4))
+    read, read_models = NuftMesh.read_nuft(filename, chunksize=chunksize, window=window)
+    assert list(read.vnC) == [3, 3, 3]
+    for ax, (lo, hi) in enumerate(window):
+        np.testing.assert_allclose(read.h[ax], mesh.h[ax][lo:hi + 1])
+        np.testing.assert_allclose(read.x0[ax], mesh.x0[ax] + mesh.h[ax][:lo].sum())
+    _assert_models(read_models, _sub(mesh, models, window))
+
+
+@pytest.mark.parametrize('chunksize', [None, 7])
+def test_bounds(tmp_path, results, chunksize):
+    mesh, models = results
+    filename = _write(str(tmp_path / 'results.txt'), mesh, models)
+    # A box touching cells 2 to 3 along x and every cell along y and z
+    nodes = mesh.x0[0] + np.r_[0., np.cumsum(mesh.h[0])]
+    bounds = ((nodes[2] + 0.1, nodes[3] + 0.1), (-1e9, 1e9), (-1e9, 1e9))
+    read, read_models = NuftMesh.read_nuft(filename, chunksize=chunksize, bounds=bounds)
+    assert list(read.vnC) == [2, SHAPE[1], SHAPE[2]]
+    _assert_models(read_models, _sub(mesh, models, ((2, 3), (0, SHAPE[1] - 1), (0, SHAPE[2] - 1))))
+
+
+def test_cache(tmp_path, results):
+    mesh, models = results
+    filename = _write(str(tmp_path / 'results.txt'), mesh, models)
+    first, first_models = NuftMesh.read_nuft(filename, cache=True)
+    assert (tmp_path / 'results.txt.nuftio').is_dir()
+    read, read_models = NuftMesh.read_nuft(filename, cache=True, variables=['P'])
+    _assert_mesh(read, mesh)
+    _assert_models(read_models, {'P': models['P']})
+    np.testing.assert_array_equal(read_models['P'], first_models['P'])
+    window = ((0, 2), (1, 3), (0, 0))
+    read, read_models = NuftMesh.read_nuft(filename, cache=True, window=window)
+    _assert_models(read_models, _sub(mesh, models, window))
+
+
+@pytest.mark.parametrize('threads', [None, 1])
+def test_layout(tmp_path, results, threads):
+    mesh, models = results
+    order = np.random.RandomState(4).permutation(mesh.nC)
+    first = _write(str(tmp_path / 'snap_0.txt'), mesh, models, order=order)
+    later = {name: mod + 1. for name, mod in models.items()}
+    second = _write(str(tmp_path / 'snap_1.txt'), mesh, later, order=order)
+    layout = NuftLayout.from_file(first, threads=threads)
+    read, read_models = NuftMesh.read_nuft(second, layout=layout, threads=threads)
+    _assert_mesh(read, mesh)
+    _assert_models(read_models, later)
@@ -0,0 +1,118 @@
+"""The mesh specifications and the material volumes made from them."""
+import numpy as np
+import pytest
+
+import nuftio
+from nuftio.spec import MaterialComponent
+
+
+GENMSH = """(genmsh
+  (coord rect)
+  (down 0 0 1)
+  (dx 6*1.0)
+  (dy 5*2.0)
+  (dz 4*0.5)
+  (mat
+    (rock sand 1 nx 1 ny 1 nz)
+    (rock clay 2 4 1 2 2 3)
+    (rock sand 3 3 1 1 2 2)
+    (wb1 well 6 6 5 5 1 nz)
+  )
+)
+"""
+
+
+@pytest.fixture
+def specs(tmp_path):
+    path = tmp_path / 'genmsh.in'
+    path.write_text(GENMSH)
+    return nuftio.read_genmsh(str(path), cache=False)
+
+
+def _painted(specs):
+    """Paints the ``mat`` boxes one by one as the original reader did"""
+    ids = {mat_type: idx for idx, mat_type in enumerate(specs.materials)}
+    mod = np.full(specs.shape, -1)
+    for el_pref in specs.mat:
+        for mat_type, comps in specs.mat[el_pref].items():
+            for mc in comps:
+                mod[mc.i[0]:mc.i[1]+1, mc.j[0]:mc.j[1]+1, mc.k[0]:mc.k[1]+1] = ids[mat_type]
+    return mod.ravel(order='F')
+
+
+def test_definitions(specs):
+    np.testing.assert_array_equal(specs.definitions, _painted(specs))
+    assert specs.materials == ['sand', 'clay', 'well']
+    assert specs.injector.sum() == 4
+
+
+def test_validate_keeps_compact_boxes(specs):
+    labels = specs.labels
+    specs.validate()
+    specs.serialize()
+    assert specs.labels is labels
+
+
+def test_mat_edits_show(specs):
+    before = specs.definitions.copy()
+    specs.mat['rock']['clay'].append(MaterialComponent(i=[4, 5], j=[3, 4], k=[0, 0]))
+    after = specs.definitions
+    # The well is painted over one of the new cells
+    assert (after != before).sum() == 3
+    np.testing.assert_array_equal(after, _painted(specs))
+    # Edit a component in place
+    specs.mat['rock']['clay'][-1].k = [0, 1]
+    np.testing.assert_array_equal(specs.definitions, _painted(specs))
+    assert specs.query_cells(np.array([[4, 3, 1]]))[0] == specs.components.index(('rock', 'clay'))
+    # Reassigning ``mat`` shows too
+    specs.mat = {'rock': {'sand': [MaterialComponent(i=[0, 5], j=[0, 4], k=[0, 3])]}}
+    np.testing.assert_array_equal(specs.definitions, np.zeros(specs.shape).ravel())
+
+
+ROCKTAB = """(rocktab
+  (sand (K0 1.0) (K1 1.0) (K2 1.0) (porosity 0.3) (solid-density 2650.0)
+    (Kd (tracer 0.0)) (KdFactor (tracer 1.0)) (tort (liquid constant (value 0.7)))
+    (kr (liquid constant (value 1.0))) (pc (liquid constant (value 0.0))))
+  (clay (K0 2.0) (K1 2.0) (K2 2.0) (porosity 0.1) (solid-density 2700.0)
+    (Kd (tracer 0.0)) (KdFactor (tracer 1.0)) (tort (liquid constant (value 0.7)))
+    (kr (liquid constant (value 1.0))) (pc (liquid constant (value 0.0))))
+  (well (K0 3.0) (K1 3.0) (K2 3.0) (porosity 0.9) (solid-density 1.0)
+    (Kd (tracer 0.0)) (KdFactor (tracer 1.0)) (tort (liquid constant (value 0.7)))
+    (kr (liquid constant (value 1.0))) (pc (liquid constant (value 0.0))))
+)
+"""
+
+
+def test_rock_type_edits_show(tmp_path):
+    mesh, rtab = tmp_path / 'genmsh.in', tmp_path / 'rocktab.in'
+    mesh.write_text(GENMSH)
+    rtab.write_text(ROCKTAB)
+    usnt = nuftio.read_usnt(str(mesh), str(rtab), cache=False)
+    sand = usnt.definitions == usnt.materials.index('sand')
+    assert np.all(usnt.model('porosity')[sand] == 0.3)
+    # Edit a rock type in place as in a parameter sweep
+    usnt.rocktab['sand'].porosity = 0.5
+    assert np.all(usnt.model('porosity')[sand] == 0.5)
+    assert np.all(usnt.cell_data()['porosity'][sand] == 0.5)
+    assert np.all(usnt.all_models()['porosity'].values[sand] == 0.5)
+    props = usnt.property_matrix[:, usnt.attributes.index('porosity')]
+    assert props[usnt.materials.index('sand')] == 0.5
+
+
+def test_box_index_matches_labels():
+    rng = np.random.RandomState(0)
+    shape = (30, 20, 25)
+    lo = np.stack([rng.randint(0, n, 300) for n in shape], -1)
+    hi = np.stack([rng.randint(l, n) for l, n in zip(lo.T, shape)], -1)
+    boxes = np.stack([lo[:, 0], hi[:, 0], lo[:, 1], hi[:, 1], lo[:, 2], hi[:, 2]], -1)
+    comps = rng.randint(0, 7, len(boxes))
+    index = nuftio.BoxIndex(boxes, comps, shape)
+    # The index is never as large as the mesh
+    assert index.cover.size + index.pair_boxes.size < np.prod(shape)
+    painted = np.full(shape, -1)
+    for (i0, i1, j0, j1, k0, k1), comp in zip(boxes, comps):
+        painted[i0:i1+1, j0:j1+1, k0:k1+1] = comp
+    ijk = np.stack(np.meshgrid(*[np.arange(n) for n in shape], indexing='ij'), -1).reshape((-1, 3))
+    np.testing.assert_array_equal(index.query_cells(ijk), painted.ravel())
+    np.testing.assert_array_equal(index.region((3, 0, 5), (12, 19, 9)), painted[3:13, 0:20, 5:10])
+    assert index.query_cells([[-1, 0, 0], [30, 0, 0]]).tolist() == [-1, -1]
@@ -0,0 +1,73 @@
+"""Reading NUFT table data files (``.tab``)."""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import nuftio
+
+
+TAB = """; boundary conditions
+(table time flux ; header
+  0.0 1.0
+  10.0 2.0
+)
+(table time flux
+  0.0 5.0
+  2.0 7.0
+  4.0 9.0
+)
+(table
+  1 2
+  3 4
+)
+"""
+
+
+@pytest.fixture
+def tab(tmp_path):
+    path = tmp_path / 'bc.tab'
+    path.write_text(TAB)
+    return str(path)
+
+
+def test_tables_are_distinct(tab):
+    dfs = nuftio.read_tab(tab)
+    assert len(dfs) == 3
+    assert all(isinstance(df, pd.DataFrame) for df in dfs)
+    assert list(dfs[0].columns) == ['time', 'flux']
+    np.testing.assert_array_equal(dfs[0].values, [[0., 1.], [10., 2.]])
+    np.testing.assert_array_equal(dfs[1].values, [[0., 5.], [2., 7.], [4., 9.]])
+    # Without a header the columns are numbered
+    assert list(dfs[2].columns) == [0, 1]
+    np.testing.assert_array_equal(dfs[2].values, [[1., 2.], [3., 4.]])
+
+
+def test_names(tab):
+    # The header is skipped when there is one and the names are used for all
+    dfs = nuftio.read_tab(tab, names=['a', 'b'])
+    assert all(list(df.columns) == ['a', 'b'] for df in dfs)
+    np.testing.assert_array_equal(dfs[0].values, [[0., 1.], [10., 2.]])
+    np.testing.assert_array_equal(dfs[2].values, [[1., 2.], [3., 4.]])
+
+
+def test_structured(tab):
+    arrs = nuftio.read_tab(tab, structured=True)
+    assert arrs[1].dtype.names == ('time', 'flux')
+    np.testing.assert_array_equal(arrs[1]['flux'], [5., 7., 9.])
+
+
+def test_iterator(tab):
+    it = nuftio.read_tab(io.StringIO(TAB), iterator=True)
+    assert not isinstance(it, list)
+    dfs = list(it)
+    expected = nuftio.read_tab(tab)
+    assert len(dfs) == len(expected)
+    for df, exp in zip(dfs, expected):
+        pd.testing.assert_frame_equal(df, exp)
+
+
+def test_malformed():
+    with pytest.raises(RuntimeError):
+        nuftio.read_tab(io.StringIO('(table a b\n1 2 3)'))
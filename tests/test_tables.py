@@ -0,0 +1,62 @@
+"""The pandas-free numeric table engine of :mod:`nuftio.tables`."""
+import numpy as np
+import pytest
+
+from nuftio import tables
+
+
+def _write(tmp_path, text):
+    path = tmp_path / 'table.txt'
+    path.write_text(text)
+    return str(path)
+
+
+@pytest.mark.parametrize('threads', [1, 2])
+@pytest.mark.parametrize('range_bytes', [None, 4])
+def test_read_columns(tmp_path, threads, range_bytes):
+    values = np.random.RandomState(0).rand(50, 3)
+    body = '\n'.join(' '.join(repr(v) for v in row) for row in values.tolist())
+    # Blank lines and no line break at the end
+    filename = _write(tmp_path, 'a b c\n\n' + body.replace('\n', '\n\n', 3))
+    cols = tables.read_columns(filename, usecols=['c', 'a'], threads=threads, range_bytes=range_bytes)
+    assert list(cols) == ['c', 'a']
+    np.testing.assert_array_equal(cols['a'], values[:, 0])
+    np.testing.assert_array_equal(cols['c'], values[:, 2])
+    chunks = list(tables.iter_columns(filename, threads=threads, range_bytes=range_bytes))
+    assert all(len(chunk['b']) for chunk in chunks)
+    np.testing.assert_array_equal(np.concatenate([chunk['b'] for chunk in chunks]), values[:, 1])
+
+
+@pytest.mark.parametrize('range_bytes', [None, 4])
+def test_malformed_rows(tmp_path, range_bytes):
+    # Nine values that would fill three rows if the lines were ignored
+    filename = _write(tmp_path, 'a b c\n1 2 3\n4 5 6 7 8 9\n\n')
+    with pytest.raises(RuntimeError, match='Malformed rows'):
+        tables.read_columns(filename, range_bytes=range_bytes)
+    with pytest.raises(RuntimeError, match='Malformed rows'):
+        list(tables.iter_columns(filename, range_bytes=range_bytes))
+
+
+def test_non_numeric(tmp_path):
+    filename = _write(tmp_path, 'a b\n1 2\n3 x\n')
+    with pytest.raises(RuntimeError, match='Non-numeric'):
+        tables.read_columns(filename)
+
+
+def test_unused_columns(tmp_path):
+    # The tokens of the columns that are not read are never parsed
+    filename = _write(tmp_path, 'a b c\n1 x 3\n4 y 6\n')
+    cols = tables.read_columns(filename, usecols=['c', 'a'])
+    np.testing.assert_array_equal(cols['a'], [1., 4.])
+    np.testing.assert_array_equal(cols['c'], [3., 6.])
+    chunk, = tables.iter_columns(filename, usecols=['c'])
+    np.testing.assert_array_equal(chunk['c'], [3., 6.])
+
+
+def test_blank_ranges(tmp_path):
+    # A blank-only range must not parse as a value in a one column table
+    filename = _write(tmp_path, 'a\n1\n\n\n2\n' + '\n' * 20)
+    np.testing.assert_array_equal(tables.read_columns(filename, range_bytes=2, threads=2)['a'], [1., 2.])
+    chunks = list(tables.iter_columns(filename, range_bytes=2))
+    np.testing.assert_array_equal(np.concatenate([chunk['a'] for chunk in chunks]), [1., 2.])
+    assert len(tables.read_columns(_write(tmp_path, 'a b\n'))['a']) == 0
@@ -0,0 +1,141 @@
+"""Round trips of the NUFT writers: everything written is read back equal."""
+import numpy as np
+import pytest
+
+import nuftio
+from nuftio import NuftMesh
+
+
+GENMSH = """; a small genmsh deck
+(genmsh
+  (coord rect)
+  (down 0 0 1)
+  (dx 3*1.5 2.0 0.25 0.25)
+  (dy 4*2)
+  (dz 1 2 3)
+  (mat
+    (rock sand 1 nx 1 ny 1 nz)
+    (rock clay 2 4 1 2 2 3)
+    (wb1 sand 1 1 1 1 1 nz)
+    (wb1 well 5 6 3 4 1 1)
+  )
+)
+"""
+
+ROCKTAB = """; a small rocktab
+(rocktab
+  (sand
+    (K0 1.0e-12) (K1 1.0e-12) (K2 1.0e-13)
+    (porosity 0.3)
+    (solid-density 2650.0)
+    (Kd (tracer 0.0))
+    (KdFactor (tracer 1.0))
+    (tort (liquid constant (value 0.7)))
+    (kr (liquid vanGenuchten (m 0.45) (Slr 0.1)) (gas vanGenuchten (m 0.45) (Slr 0.1)))
+    (pc (liquid vanGenuchten (m 0.45) (alpha 1.2e-4) (Slr 0.1)))
+  )
+  (clay
+    (K0 3.3e-17) (K1 3.3e-17) (K2 1.1e-18)
+    (porosity 0.12345678901234)
+    (solid-density 2700.5)
+    (Kd (tracer 2.5) (other 0.125))
+    (KdFactor (tracer 1.0) (other 3.0))
+    (tort (liquid constant (value 0.25)) (gas constant (value 0.5)))
+    (kr (liquid vanGenuchten (m 0.2) (Slr 0.35)))
+    (pc (liquid vanGenuchten (m 0.2) (alpha 3.0e-6) (Slr 0.35)))
+  )
+  (well
+    (K0 1.0e-9) (K1 1.0e-9) (K2 1.0e-9)
+    (porosity 0.99)
+    (solid-density 1.0)
+    (Kd (tracer 0.0))
+    (KdFactor (tracer 1.0))
+    (tort (liquid constant (value 1.0)))
+    (kr (liquid constant (value 1.0)))
+    (pc (liquid constant (value 0.0)))
+  )
+)
+"""
+
+
+@pytest.fixture
+def decks(tmp_path):
+    mesh = tmp_path / 'genmsh.in'
+    rtab = tmp_path / 'rocktab.in'
+    mesh.write_text(GENMSH)
+    rtab.write_text(ROCKTAB)
+    return str(mesh), str(rtab)
+
+
+def _assert_specs_equal(a, b):
+    for key in ['dx', 'dy', 'dz']:
+        np.testing.assert_array_equal(getattr(a, key), getattr(b, key))
+    assert a.shape == b.shape
+    np.testing.assert_array_equal(a.definitions, b.definitions)
+    np.testing.assert_array_equal(a.injector, b.injector)
+    assert a.materials == b.materials
+
+
+def _assert_rocktab_equal(a, b):
+    assert sorted(a) == sorted(b)
+    for name in a:
+        assert a[name].serialize() == b[name].serialize()
+
+
+def _assert_usnt_equal(a, b):
+    _assert_specs_equal(a, b)
+    _assert_rocktab_equal(a.rocktab, b.rocktab)
+    for attr in a.attributes:
+        np.testing.assert_array_equal(a.model(attr), b.model(attr))
+
+
+def test_write_genmsh(decks, tmp_path):
+    specs = nuftio.read_genmsh(decks[0], cache=False)
+    out = str(tmp_path / 'out_genmsh.in')
+    nuftio.write_genmsh(out, specs)
+    _assert_specs_equal(specs, nuftio.read_genmsh(out, cache=False))
+
+
+def test_write_rocktab(decks, tmp_path):
+    rocktab = nuftio.read_rocktab(decks[1], cache=False)
+    out = str(tmp_path / 'out_rocktab.in')
+    nuftio.write_rocktab(out, rocktab)
+    _assert_rocktab_equal(rocktab, nuftio.read_rocktab(out, cache=False))
+
+
+def test_write_usnt_one_file(decks, tmp_path):
+    usnt = nuftio.read_usnt(*decks, cache=False)
+    out = str(tmp_path / 'deck.in')
+    nuftio.write_usnt(out, usnt)
+    _assert_usnt_equal(usnt, nuftio.read_usnt(out, out, cache=False))
+
+
+def test_write_usnt_two_files(decks, tmp_path):
+    usnt = nuftio.read_usnt(*decks, cache=False)
+    mesh, rtab = str(tmp_path / 'mesh.in'), str(tmp_path / 'rtab.in')
+    nuftio.write_usnt(mesh, usnt, fname_rtab=rtab)
+    _assert_usnt_equal(usnt, nuftio.read_usnt(mesh, rtab, cache=False))
+
+
+@pytest.mark.parametrize('chunksize', [1000000, 7])
+def test_write_nuft(tmp_path, chunksize):
+    rng = np.random.RandomState(0)
+    mesh = NuftMesh([rng.uniform(1., 2., n) for n in (4, 3, 5)], x0=(10., -5., 100.))
+    models = {'Sl': rng.rand(mesh.nC), 'P': rng.rand(mesh.nC) * 1e5}
+    models['Sl'][3] = np.nan
+    out = str(tmp_path / 'results.txt')
+    mesh.write_nuft(out, models, chunksize=chunksize)
+    # The numeric table engine is correctly rounded so the values are exact
+    read, read_models = NuftMesh.read_nuft(out, threads=1)
+    assert list(read.vnC) == list(mesh.vnC)
+    for h, hr in zip(mesh.h, read.h):
+        np.testing.assert_allclose(hr, h)
+    np.testing.assert_allclose(read.x0, mesh.x0)
+    assert sorted(read_models) == sorted(models)
+    for name, mod in models.items():
+        np.testing.assert_array_equal(read_models[name], mod)
+    # The default pandas float parser is not correctly rounded
+    read, read_models = NuftMesh.read_nuft(out)
+    assert list(read.vnC) == list(mesh.vnC)
+    for name, mod in models.items():
+        np.testing.assert_allclose(read_models[name], mod, rtol=1e-14, atol=1e-15)